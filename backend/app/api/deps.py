@@ -29,3 +29,21 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+
+def get_club_or_404(db: Session, club_id: str) -> Club:
+    club = db.get(Club, club_id)
+    if not club:
+        raise HTTPException(status_code=404, detail="Club not found")
+    return club
+
+
+def get_club_plan(db: Session, club_id: str) -> str:
+    """Plan of the club's latest active subscription ("free" without one)."""
+    sub = (
+        db.query(Subscription)
+        .filter(Subscription.club_id == club_id, Subscription.is_active == True)  # noqa: E712
+        .order_by(Subscription.created_at.desc())
+        .first()
+    )
+    return sub.plan if sub else "free"
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from app.services.storage import get_backend, get_local_path, object_key, object_stat, presigned_url, read_range
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]] | bool:
+    """Parse a single "bytes=" range.
+
+    Returns (start, end) inclusive, None when unsatisfiable, or False when the header
+    should be ignored (malformed or multi-range: we answer those with the full body).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return False
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                return None
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return False
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    # Weak comparison, as required for If-None-Match.
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(mtime) <= since.timestamp()
+
+
+def _validator_headers(tag: str, mtime: float, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    h = dict(headers or {})
+    h["ETag"] = tag
+    h["Last-Modified"] = format_datetime(datetime.fromtimestamp(int(mtime), tz=timezone.utc), usegmt=True)
+    h["Accept-Ranges"] = "bytes"
+    return h
+
+
+def _is_not_modified(request: Request, tag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    ims = request.headers.get("if-modified-since")
+    return bool((inm and _etag_matches(inm, tag)) or (not inm and ims and _not_modified_since(ims, mtime)))
+
+
+def cached_file_response(
+    request: Request,
+    path: str,
+    etag: str,
+    media_type: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serve a node-local derived file (see services.disk_cache) with the same validators."""
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    tag = f'"{etag}"'
+    h = _validator_headers(tag, mtime, headers)
+    if _is_not_modified(request, tag, mtime):
+        return Response(status_code=304, headers=h)
+    return FileResponse(path, media_type=media_type, headers=h)
+
+
+def stored_file_response(
+    request: Request,
+    storage_key: str,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    etag: Optional[str] = None,
+) -> Response:
+    """Serve a stored file whatever the storage backend.
+
+    Every response carries a strong ETag (the content hash for deduplicated blobs;
+    legacy and export files are immutable, so their id works as well) plus
+    Last-Modified. If-None-Match / If-Modified-Since answer 304 and single byte
+    ranges answer 206 (honouring If-Range), also for remote backends.
+
+    - Remote backends with presigned URLs: redirect, so the bytes never pass through the API.
+    - Local backend: straight from disk.
+    - Remote backends without presigning: stream the object through.
+    """
+    try:
+        key = object_key(storage_key)
+        size, mtime = object_stat(key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    tag = f'"{etag or os.path.splitext(key.rsplit("/", 1)[-1])[0]}"'
+    h = _validator_headers(tag, mtime, headers)
+    if _is_not_modified(request, tag, mtime):
+        return Response(status_code=304, headers=h)
+
+    backend = get_backend()
+    if not backend.is_local:
+        url = presigned_url(key, filename=filename, content_type=media_type)
+        if url:
+            return RedirectResponse(url, status_code=307, headers={"ETag": tag})
+    if filename:
+        h["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and (not if_range or if_range.strip() in (tag, h["Last-Modified"])):
+        parsed = _parse_range(rng, size)
+        if parsed is None:
+            return Response(status_code=416, headers={**h, "Content-Range": f"bytes */{size}"})
+        if parsed:
+            start, end = parsed
+            h["Content-Range"] = f"bytes {start}-{end}/{size}"
+            h["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(read_range(key, start, end), status_code=206, media_type=media_type, headers=h)
+
+    if not backend.is_local:
+        h["Content-Length"] = str(size)
+        return StreamingResponse(read_range(key), media_type=media_type, headers=h)
+
+    try:
+        path = get_local_path(storage_key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    h.pop("Content-Disposition", None)
+    return FileResponse(path, media_type=media_type, filename=filename, headers=h)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 
 from app.core.db import get_db
 from app.api.deps import require_super_admin
+from app.core.queue import queue
 from app.core.settings import settings
 from app.models.models import User, Club
 
@@ -83,3 +84,16 @@ def set_allowed_templates(club_id: str, payload: AllowedTemplatesPayload, db: Se
     db.commit()
     db.refresh(club)
     return {"ok": True, "allowed_template_ids": club.allowed_template_ids}
+
+
+@router.post("/storage/gc")
+def run_asset_gc(req: Request, dry_run: bool = False, db: Session = Depends(get_db), _=Depends(require_super_admin)):
+    """Sweep orphaned assets/files (queued when a worker is available)."""
+    if not _ip_allowed(req):
+        raise HTTPException(status_code=403, detail="IP not allowed")
+    if queue is None:
+        from app.services.asset_gc import collect_garbage
+        return {"ok": True, **collect_garbage(db, dry_run=dry_run)}
+    from app.jobs import gc_assets_job  # lazy import (keeps startup robust)
+    job = queue.enqueue(gc_assets_job, settings.DATABASE_URL, None, dry_run, job_timeout=3600)
+    return {"ok": True, "job_id": job.get_id()}
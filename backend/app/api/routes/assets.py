@@ -1,18 +1,27 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from PIL import Image
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
+from app.core.settings import settings
 from app.api.deps import get_current_user
+from app.api.files import cached_file_response, stored_file_response
+from app.api.uploads import limited_body_route
 from app.models.models import Club, Asset
-from app.services.storage import save_local_file, get_local_path
+from app.services.blob_store import save_asset_stream, replace_asset_content
+from app.services.image_derivatives import FORMATS as DERIVATIVE_FORMATS, get_derivative, normalize_width
+from app.services.page_raster import get_page_raster, normalize_zoom, raster_key
+from app.services.storage import EmptyUpload, UploadTooLarge, get_local_path
 
-router = APIRouter(prefix="/api/assets", tags=["assets"])
+router = APIRouter(prefix="/api/assets", tags=["assets"], route_class=limited_body_route("UPLOAD_MAX_BYTES"))
 
 
 @router.post("/{club_id}")
-async def upload_asset(
+def upload_asset(
     club_id: str,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -22,27 +31,28 @@ async def upload_asset(
     if not club or club.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Club not found")
 
-    content = await file.read()
-    if not content:
+    # Plain `def` route: FastAPI runs it in the threadpool, so streaming the upload
+    # to disk never blocks the event loop. Identical bytes are stored once.
+    try:
+        asset = save_asset_stream(
+            db,
+            file.file,
+            file.filename or "asset.bin",
+            file.content_type or "application/octet-stream",
+            club_id=club.id,
+            max_bytes=settings.UPLOAD_MAX_BYTES,
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    except EmptyUpload:
         raise HTTPException(status_code=400, detail="Empty upload")
-
-    asset_id, _path = save_local_file(content, file.filename or "asset.bin")
-
-    asset = Asset(
-        id=asset_id,
-        club_id=club.id,
-        filename=file.filename or "asset.bin",
-        mime=file.content_type or "application/octet-stream",
-        storage_path=asset_id,
-    )
-    db.add(asset)
     db.commit()
 
-    return {"id": asset_id, "url": f"/api/assets/file/{asset_id}", "filename": asset.filename, "mime": asset.mime}
+    return {"id": asset.id, "url": f"/api/assets/file/{asset.id}", "filename": asset.filename, "mime": asset.mime}
 
 
 @router.put("/{asset_id}")
-async def replace_asset(
+def replace_asset(
     asset_id: str,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -56,32 +66,90 @@ async def replace_asset(
     if not club or club.owner_id != user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    content = await file.read()
-    if not content:
+    # Apuntamos al nuevo contenido, pero mantenemos el mismo asset_id (para "reemplazar")
+    try:
+        replace_asset_content(
+            db,
+            asset,
+            file.file,
+            file.filename or asset.filename,
+            file.content_type or asset.mime,
+            max_bytes=settings.UPLOAD_MAX_BYTES,
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    except EmptyUpload:
         raise HTTPException(status_code=400, detail="Empty upload")
-
-    # Guardamos como nuevo fichero, pero mantenemos el mismo asset_id (para "reemplazar")
-    new_id, _path = save_local_file(content, file.filename or asset.filename)
-
-    asset.filename = file.filename or asset.filename
-    asset.mime = file.content_type or asset.mime
-    asset.storage_path = new_id
-    db.add(asset)
     db.commit()
 
     return {"id": asset.id, "url": f"/api/assets/file/{asset.id}", "filename": asset.filename, "mime": asset.mime}
 
 
 @router.get("/file/{asset_id}")
-def get_asset_file(asset_id: str, db: Session = Depends(get_db)):
+def get_asset_file(
+    asset_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1),
+    fmt: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     asset = db.get(Asset, asset_id)
     # Si no está en DB, igualmente intentamos resolverlo por storage (compat)
+    storage_key = asset.storage_path if asset else asset_id
+    media = asset.mime if asset else None
+    # replace_asset keeps the id but changes the bytes, so clients revalidate;
+    # the content-hash ETag makes that a cheap 304.
+    headers = {"Cache-Control": "public, no-cache"}
+
+    # ?w=400&fmt=webp: resized variant, generated once and served from the derivative cache.
+    if (w or fmt) and (media or "").startswith("image/") and media != "image/svg+xml":
+        fmt = (fmt or "webp").lower()
+        if fmt not in DERIVATIVE_FORMATS:
+            raise HTTPException(status_code=400, detail="Unsupported format")
+        content_id = asset.blob_id or os.path.splitext(os.path.basename(storage_key))[0]
+        try:
+            path, mime = get_derivative(get_local_path(storage_key), content_id, w, fmt)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        except (OSError, Image.DecompressionBombError):
+            # Not decodable by PIL: serve the original instead.
+            path = None
+        if path:
+            tag = f"{content_id}-w{normalize_width(w) if w else 0}.{fmt}"
+            return cached_file_response(request, path, etag=tag, media_type=mime, headers=headers)
+
+    return stored_file_response(request, storage_key, media_type=media, headers=headers,
+                                etag=asset.blob_id if asset else None)
+
+
+@router.get("/file/{asset_id}/page/{page_index}")
+def get_pdf_page_raster(
+    asset_id: str,
+    page_index: int,
+    request: Request,
+    zoom: float = Query(1.0, gt=0),
+    tx: Optional[int] = Query(None, ge=0),
+    ty: Optional[int] = Query(None, ge=0),
+    fmt: str = "webp",
+    q: int = Query(80, ge=30, le=95),
+    db: Session = Depends(get_db),
+):
+    """Raster of one page of a stored PDF (whole page, or tile tx,ty for deep zoom)."""
+    asset = db.get(Asset, asset_id)
+    if not asset or asset.mime != "application/pdf":
+        raise HTTPException(status_code=404, detail="PDF not found")
+    fmt = fmt.lower()
+    if fmt not in DERIVATIVE_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    if (tx is None) != (ty is None):
+        raise HTTPException(status_code=400, detail="tx and ty go together")
+    tile = (tx, ty) if tx is not None else None
+    content_id = asset.blob_id or os.path.splitext(os.path.basename(asset.storage_path))[0]
     try:
-        storage_key = asset.storage_path if asset else asset_id
-        path = get_local_path(storage_key)
+        path, mime = get_page_raster(get_local_path(asset.storage_path), content_id, page_index, zoom, tile, fmt, q)
     except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Asset not found")
-
-    media = asset.mime if asset else None
-    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
-    return FileResponse(path, media_type=media, headers=headers)
+        raise HTTPException(status_code=404, detail="File not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tag = f"{raster_key(content_id, page_index, normalize_zoom(zoom), tile, q)}.{fmt}"
+    return cached_file_response(request, path, etag=tag, media_type=mime, headers={"Cache-Control": "public, no-cache"})
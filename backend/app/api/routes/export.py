@@ -3,29 +3,20 @@ from __future__ import annotations
 import json
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
+from app.core.queue import queue
 from app.core.settings import settings
 from app.api.deps import get_current_user, get_club_plan, get_club_or_404
+from app.api.files import stored_file_response
 from app.models.models import Project, Club
 from app.services.pdf_exporter import export_document_to_pdf
-from app.services.storage import get_local_path
 
-# Optional queue support (RQ/Redis). If REDIS_URL isn't configured (or fails),
-# we fall back to synchronous export.
-_q = None
-try:
-    if getattr(settings, "REDIS_URL", None):
-        import redis
-        from rq import Queue
-
-        redis_conn = redis.from_url(settings.REDIS_URL)
-        _q = Queue("default", connection=redis_conn)
-except Exception:
-    _q = None
+# Optional queue support (RQ/Redis). Without it we fall back to synchronous export.
+_q = queue
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -58,7 +49,8 @@ def export_project(project_id: str, payload: dict, db: Session = Depends(get_db)
 
     # No queue -> sync export
     if _q is None:
-        pdf_bytes = export_document_to_pdf(db, json.loads(proj.document_json), quality=quality, watermark=watermark)
+        pdf_bytes = export_document_to_pdf(db, json.loads(proj.document_json), quality=quality, watermark=watermark,
+                                           locked_logo_asset_id=club.locked_logo_asset_id)
         filename = f"Revista_{_safe_filename(club.name)}.pdf"
         return Response(
             content=pdf_bytes,
@@ -88,7 +80,8 @@ def export_project_sync(project_id: str, payload: dict, db: Session = Depends(ge
     plan = get_club_plan(db, club.id)
     watermark = True if plan != "pro" else False
 
-    pdf_bytes = export_document_to_pdf(db, json.loads(proj.document_json), quality=quality, watermark=watermark)
+    pdf_bytes = export_document_to_pdf(db, json.loads(proj.document_json), quality=quality, watermark=watermark,
+                                       locked_logo_asset_id=club.locked_logo_asset_id)
 
     # Lock templates on first export (business rule)
     if club and not getattr(club, "templates_locked", False):
@@ -125,10 +118,8 @@ def export_status_alias(job_id: str):
 
 
 @router.get("/download/{asset_id}")
-def download_export(asset_id: str, filename: Optional[str] = Query(default=None)):
-    try:
-        path = get_local_path(asset_id)
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
+def download_export(asset_id: str, request: Request, filename: Optional[str] = Query(default=None)):
     dl = filename or "Revista.pdf"
-    return FileResponse(path, media_type="application/pdf", filename=dl)
+    # Export files are never rewritten: let browsers/CDN keep them and resume downloads.
+    headers = {"Cache-Control": "private, max-age=86400"}
+    return stored_file_response(request, asset_id, media_type="application/pdf", filename=dl, headers=headers)
@@ -1,19 +1,31 @@
 from __future__ import annotations
 import json
+import os
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
+from app.core.queue import queue
+from app.core.settings import settings
 from app.api.deps import get_current_user, get_club_or_404
+from app.api.uploads import limited_body_route
 from app.models.models import Project
-from app.services.pdf_importer import import_pdf_to_document
-from app.services.storage import save_local_file
+from app.services.blob_store import get_asset_path, save_asset_stream
+from app.services.import_runner import (
+    IMPORT_DONE,
+    create_import_project,
+    import_state,
+    run_pdf_import,
+    set_import_job,
+)
+from app.services.pdf_importer import ImportTooLarge
+from app.services.storage import EmptyUpload, UploadTooLarge, get_local_path
 
-router = APIRouter(prefix="/api/import", tags=["import"])
+router = APIRouter(prefix="/api/import", tags=["import"], route_class=limited_body_route("PDF_IMPORT_MAX_BYTES", "PDF too large"))
 
 
 @router.post("/{club_id}")
-async def import_pdf(
+def import_pdf(
     club_id: str,
     mode: str = "safe",
     preset: str = "background",
@@ -30,24 +42,99 @@ async def import_pdf(
     if up is None:
         raise HTTPException(status_code=422, detail="Missing file")
 
-    pdf_bytes = await up.read()
-    if not pdf_bytes or len(pdf_bytes) < 500:
+    # Guarda el PDF fuente en streaming (por si luego quieres detección avanzada).
+    # The importer then works from the stored file, never from an in-memory copy.
+    try:
+        source = save_asset_stream(db, up.file, f"source_{club_id}.pdf", "application/pdf",
+                                   club_id=club_id, max_bytes=settings.PDF_IMPORT_MAX_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="PDF too large")
+    except EmptyUpload:
         raise HTTPException(status_code=400, detail="Invalid PDF")
+    pdf_path = get_local_path(source.storage_path)
+    if os.path.getsize(pdf_path) < 500:
+        raise HTTPException(status_code=400, detail="Invalid PDF")
+
+    # The project exists from the start, with a placeholder per page: pages appear
+    # in it as they are imported (see services.import_runner).
+    try:
+        proj = create_import_project(db, club_id, pdf_path, source.id, source.blob_id, up.filename, mode, preset)
+    except RuntimeError:  # fitz: not a readable PDF
+        raise HTTPException(status_code=400, detail="Invalid PDF")
+    except ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    state = import_state(json.loads(proj.document_json))
+    if state["status"] == IMPORT_DONE:  # same PDF imported before: cloned from the cache
+        return {"project_id": proj.id, **state}
+    return _start_import(db, proj, source.id)
+
 
-    # Guarda el PDF fuente (por si luego quieres detección avanzada)
-    source_pdf_asset_id, _src_path = save_local_file(pdf_bytes, filename=f"source_{club_id}.pdf")
+def _start_import(db: Session, proj: Project, source_asset_id: str) -> dict:
+    from app.jobs import import_pdf_job  # lazy import (keeps startup robust)
 
-    document, _assets = import_pdf_to_document(db, club_id, pdf_bytes, mode=mode, preset=preset)
-    document.setdefault("meta", {})["source_pdf_asset_id"] = source_pdf_asset_id
+    # Queue the import (requires a worker): the request returns right away.
+    # Without Redis we import synchronously.
+    if queue is None:
+        pdf_path = get_asset_path(db, source_asset_id)
+        return run_pdf_import(db, proj.id, pdf_path)
 
-    proj = Project(
-        club_id=club_id,
-        name=f"Importado - {up.filename or 'documento.pdf'}",
-        template_id="import_pdf",
-        document_json=json.dumps(document, ensure_ascii=False),
+    job = queue.enqueue(
+        import_pdf_job, proj.id, source_asset_id, settings.DATABASE_URL,
+        job_timeout=3600, meta={"club_id": proj.club_id, "project_id": proj.id},
     )
-    db.add(proj)
-    db.commit()
-    db.refresh(proj)
+    state = set_import_job(db, proj.id, job.get_id())
+    return {"project_id": proj.id, **state, "job_id": job.get_id(), "status": "queued"}
+
+
+def _import_project_or_404(db: Session, project_id: str, user) -> tuple[Project, dict]:
+    proj = db.get(Project, project_id)
+    if not proj:
+        raise HTTPException(status_code=404, detail="Project not found")
+    club = get_club_or_404(db, proj.club_id)
+    if club.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    doc = json.loads(proj.document_json or "{}")
+    if import_state(doc) is None:
+        raise HTTPException(status_code=400, detail="Not an import project")
+    return proj, doc
 
-    return {"project_id": proj.id, "pages": len(document.get("pages", [])), "mode": mode, "preset": preset}
+
+@router.get("/project/{project_id}/status")
+def import_project_status(project_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Per-page import status: finished pages can be opened while the rest import."""
+    _proj, doc = _import_project_or_404(db, project_id, user)
+    return {"project_id": project_id, **import_state(doc)}
+
+
+@router.post("/project/{project_id}/resume")
+def resume_import(project_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Restart an interrupted or failed import from its checkpoint (pending pages only)."""
+    proj, doc = _import_project_or_404(db, project_id, user)
+    state = import_state(doc)
+    if state.get("status") == IMPORT_DONE:
+        return {"project_id": project_id, **state}
+    job = queue.fetch_job(state["job_id"]) if queue is not None and state.get("job_id") else None
+    if job is not None and not (job.is_failed or job.is_finished or job.is_stopped or job.is_canceled):
+        raise HTTPException(status_code=409, detail="Import still running")
+    source_asset_id = (doc.get("meta") or {}).get("source_pdf_asset_id")
+    if not source_asset_id:
+        raise HTTPException(status_code=400, detail="No source PDF stored for this project")
+    return _start_import(db, proj, source_asset_id)
+
+
+@router.get("/job/{job_id}")
+def import_status(job_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    if queue is None:
+        raise HTTPException(status_code=400, detail="Queue not configured")
+    job = queue.fetch_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    club = get_club_or_404(db, job.meta.get("club_id"))
+    if club.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    progress = job.meta.get("progress") or {}
+    if job.is_failed:
+        return {"status": "failed", "error": str(job.exc_info), **progress}
+    if job.is_finished:
+        return {"status": "finished", **progress, **(job.result or {})}
+    return {"status": "started" if job.is_started else "queued", **progress}
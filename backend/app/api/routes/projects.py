@@ -8,12 +8,28 @@ from app.core.db import get_db
 from app.api.deps import get_current_user, get_club_or_404
 from app.models.models import Project, Template
 from app.schemas.schemas import ProjectCreate, ProjectOut, ProjectUpdate
-from app.services.pdf_importer import detect_pdf_page_overlays
-from app.services.storage import get_path_for_asset
+from app.services.import_runner import keep_import_progress
+from app.services.overlay_index import detect_from_source, index_page
+from app.services.blob_store import get_asset_path
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
 
+def _locked_project(db: Session, project_id: str) -> Project | None:
+    """The project row, locked until commit and re-read from the database.
+
+    Routes that rewrite document_json load it this way, like import checkpoints
+    (import_runner._checkpoint), so neither overwrites pages the other just saved.
+    """
+    return (
+        db.query(Project)
+        .filter(Project.id == project_id)
+        .with_for_update()
+        .populate_existing()
+        .one_or_none()
+    )
+
+
 @router.post("/item/{project_id}/detect/{page_index}")
 def detect_page(
     project_id: str,
@@ -34,18 +50,40 @@ def detect_page(
     if page_index < 0 or page_index >= len(pages):
         raise HTTPException(status_code=400, detail="Invalid page_index")
 
-    source_pdf_asset_id = (doc.get("meta") or {}).get("source_pdf_asset_id")
-    if not source_pdf_asset_id:
-        raise HTTPException(status_code=400, detail="No source PDF stored for this project")
-    pdf_path = get_path_for_asset(source_pdf_asset_id)
-    if not os.path.exists(pdf_path):
-        raise HTTPException(status_code=400, detail="Source PDF file not found on server")
-
-    with open(pdf_path, "rb") as f:
-        pdf_bytes = f.read()
-
-    detected = detect_pdf_page_overlays(db=db, club_id=proj.club_id, pdf_bytes=pdf_bytes, page_index=page_index)
-    # Persist detected overlays into the project document
+    meta = doc.get("meta") or {}
+    detected = None
+    # Imports store detection results for every page in an index asset.
+    index_asset_id = meta.get("overlay_index_asset_id")
+    if index_asset_id:
+        try:
+            detected = index_page(get_asset_path(db, index_asset_id), page_index)
+        except FileNotFoundError:
+            detected = None
+
+    if detected is None:
+        source_pdf_asset_id = meta.get("source_pdf_asset_id")
+        if not source_pdf_asset_id:
+            raise HTTPException(status_code=400, detail="No source PDF stored for this project")
+        try:
+            pdf_path = get_asset_path(db, source_pdf_asset_id)
+        except FileNotFoundError:
+            pdf_path = ""
+        if not pdf_path or not os.path.exists(pdf_path):
+            raise HTTPException(status_code=400, detail="Source PDF file not found on server")
+        try:
+            detected = detect_from_source(source_pdf_asset_id, pdf_path, page_index)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid page_index")
+
+    # Persist detected overlays into the project document, re-read under the row lock
+    # (detection can take a while; an import checkpoint may have committed meanwhile).
+    proj = _locked_project(db, project_id)
+    if not proj:
+        raise HTTPException(status_code=404, detail="Project not found")
+    doc = json.loads(proj.document_json or "{}")
+    pages = doc.get("pages") or []
+    if page_index >= len(pages):
+        raise HTTPException(status_code=400, detail="Invalid page_index")
     page = pages[page_index]
     page.setdefault("detected", {})
     page["detected"]["text"] = detected.get("text", [])
@@ -90,7 +128,7 @@ def get_project(project_id: str, db: Session = Depends(get_db), user=Depends(get
 
 @router.put("/item/{project_id}", response_model=ProjectOut)
 def update_project(project_id: str, payload: ProjectUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    proj = db.get(Project, project_id)
+    proj = _locked_project(db, project_id)
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
     club = get_club_or_404(db, proj.club_id)
@@ -98,7 +136,9 @@ def update_project(project_id: str, payload: ProjectUpdate, db: Session = Depend
         raise HTTPException(status_code=403, detail="Forbidden")
     if payload.name is not None:
         proj.name = payload.name
-    proj.document_json = json.dumps(payload.document, ensure_ascii=False)
+    # An editor opened mid-import must not overwrite pages imported since.
+    document = keep_import_progress(json.loads(proj.document_json or "{}"), payload.document)
+    proj.document_json = json.dumps(document, ensure_ascii=False)
     proj.updated_at = datetime.utcnow()
     db.commit(); db.refresh(proj)
     return ProjectOut(id=proj.id, club_id=proj.club_id, name=proj.name, template_id=proj.template_id, document=json.loads(proj.document_json))
@@ -112,7 +152,7 @@ def update_project_page(project_id: str, page_index: int, payload: dict, db: Ses
     as the source of truth.
     Expected payload: {"page": <page_object>}
     """
-    proj = db.get(Project, project_id)
+    proj = _locked_project(db, project_id)
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
     club = get_club_or_404(db, proj.club_id)
@@ -127,8 +167,10 @@ def update_project_page(project_id: str, page_index: int, payload: dict, db: Ses
     if not isinstance(page, dict):
         raise HTTPException(status_code=400, detail="Missing page")
 
+    stored = json.loads(proj.document_json)
     pages[page_index] = page
     doc["pages"] = pages
+    doc = keep_import_progress(stored, doc)
     proj.document_json = json.dumps(doc, ensure_ascii=False)
     proj.updated_at = datetime.utcnow()
     db.commit(); db.refresh(proj)
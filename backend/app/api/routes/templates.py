@@ -1,5 +1,5 @@
 from __future__ import annotations
-import json, time, uuid
+import json, os, time, uuid
 from fastapi import APIRouter, Body, Depends, HTTPException
 from importlib import import_module
 from fastapi.responses import Response
@@ -9,6 +9,8 @@ from app.core.db import get_db
 from app.api.deps import get_current_user
 from app.models.models import Template, Club, Asset, User
 from app.services.storage import get_local_path
+from app.services.image_derivatives import get_derivative
+from app.services.data_uri_cache import RASTER_MIMES, inline_image
 from app.schemas.schemas import TemplateOut, TemplateGenerateRequest
 # NOTE:
 # We intentionally avoid importing the template generator at module import time.
@@ -103,15 +105,23 @@ def _render_template_thumbnail(document: dict, db: Session, size: int = 320, pag
             # Try to render the actual asset if we have one, otherwise fall back to a neutral placeholder.
             rendered = False
 
+            ref = it.get("assetRef")
             asset_id = it.get("assetId") or it.get("asset_id")
+            if not asset_id and isinstance(ref, str) and ref and not ref.startswith("data:") and "{{" not in ref:
+                asset_id = ref
             # Some documents store images as data URIs (src). If it's PNG/JPG we can render it.
-            src = it.get("src") or it.get("url")
+            src = it.get("src") or it.get("url") or (ref if isinstance(ref, str) and ref.startswith("data:") else None)
 
             try:
                 if asset_id:
                     a = db.get(Asset, str(asset_id))
                     if a and a.storage_path:
-                        p = get_local_path(a.storage_path)
+                        # Downscaled cached variant instead of decoding the full-size original.
+                        p, _mime = get_derivative(
+                            get_local_path(a.storage_path),
+                            a.blob_id or os.path.splitext(os.path.basename(a.storage_path))[0],
+                            max(rw, rh),
+                        )
                         img = Image.open(p).convert("RGBA")
                         img = img.resize((max(1, rw), max(1, rh)))
                         im.alpha_composite(img, dest=(x, y))
@@ -119,12 +129,10 @@ def _render_template_thumbnail(document: dict, db: Session, size: int = 320, pag
 
                 if (not rendered) and isinstance(src, str) and src.startswith("data:image/"):
                     # Best-effort: only handle base64 PNG/JPG. (We intentionally skip SVG for speed/compat.)
-                    if ";base64," in src and (src.startswith("data:image/png") or src.startswith("data:image/jpeg") or src.startswith("data:image/jpg")):
-                        import base64, io
-                        b64 = src.split(";base64,", 1)[1]
-                        raw = base64.b64decode(b64)
-                        img = Image.open(io.BytesIO(raw)).convert("RGBA")
-                        img = img.resize((max(1, rw), max(1, rh)))
+                    # Decoded once per process (services.data_uri_cache), shared with the exporter.
+                    inline = inline_image(src)
+                    if inline is not None and inline.mime in RASTER_MIMES:
+                        img = inline.image().resize((max(1, rw), max(1, rh)))
                         im.alpha_composite(img, dest=(x, y))
                         rendered = True
             except Exception:
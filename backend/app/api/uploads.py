@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Coroutine
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from starlette.types import Message
+
+from app.core.settings import settings
+
+# Request body limits for upload routes
+# -------------------------------------
+# FastAPI parses a multipart body (spooling files to its own temp files) before the
+# route runs, so the max_bytes checks of store_blob_stream only start once the whole
+# upload is on disk. Routers that take uploads use limited_body_route() instead: a
+# body announcing more than the limit (Content-Length) is refused before any of it is
+# read, and one without a length is cut off as soon as it streams past the limit.
+# The exact per-file limit is still enforced by store_blob_stream.
+
+# Multipart framing (boundaries, part headers, small form fields) around the file.
+_FORM_OVERHEAD = 64 * 1024
+
+
+def limited_body_route(limit_setting: str, detail: str = "File too large") -> type[APIRoute]:
+    """APIRoute class refusing request bodies over settings.<limit_setting> with 413."""
+
+    class LimitedBodyRoute(APIRoute):
+        def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+            handler = super().get_route_handler()
+
+            async def limited_handler(request: Request) -> Response:
+                limit = int(getattr(settings, limit_setting)) + _FORM_OVERHEAD
+                length = request.headers.get("content-length")
+                if length is not None:
+                    try:
+                        too_large = int(length) > limit
+                    except ValueError:
+                        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+                    if too_large:
+                        raise HTTPException(status_code=413, detail=detail)
+                    return await handler(request)
+
+                received = 0
+                receive = request.receive
+
+                async def counted_receive() -> Message:
+                    nonlocal received
+                    message = await receive()
+                    if message["type"] == "http.request":
+                        received += len(message.get("body", b""))
+                        if received > limit:
+                            raise HTTPException(status_code=413, detail=detail)
+                    return message
+
+                return await handler(Request(request.scope, counted_receive))
+
+            return limited_handler
+
+    return LimitedBodyRoute
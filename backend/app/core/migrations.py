@@ -32,3 +32,13 @@ def ensure_schema(engine: Engine) -> None:
     if not _has_column(engine, "clubs", "allowed_template_ids"):
         with engine.begin() as conn:
             conn.execute(text("ALTER TABLE clubs ADD COLUMN allowed_template_ids TEXT"))
+
+    # Content-addressed storage: assets point at a shared blob
+    if not _has_column(engine, "assets", "blob_id"):
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE assets ADD COLUMN blob_id VARCHAR(64)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_assets_blob_id ON assets (blob_id)"))
+    if not _has_column(engine, "blobs", "last_used_at"):
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE blobs ADD COLUMN last_used_at TIMESTAMP"))
+            conn.execute(text("UPDATE blobs SET last_used_at = created_at WHERE last_used_at IS NULL"))
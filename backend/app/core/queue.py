@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from app.core.settings import settings
+
+# Optional queue support (RQ/Redis). If REDIS_URL isn't configured (or fails),
+# callers fall back to running the work synchronously.
+queue = None
+try:
+    if getattr(settings, "REDIS_URL", None):
+        import redis
+        from rq import Queue
+
+        redis_conn = redis.from_url(settings.REDIS_URL)
+        queue = Queue("default", connection=redis_conn)
+except Exception:
+    queue = None
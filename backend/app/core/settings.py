@@ -8,10 +8,63 @@ class Settings(BaseSettings):
     APP_JWT_EXPIRE_MIN: int = 60 * 24 * 7
     DATABASE_URL: str = "postgresql+psycopg://postgres:postgres@db:5432/magazine"
     REDIS_URL: str = "redis://redis:6379/0"
-    STORAGE_MODE: str = "local"
+    STORAGE_MODE: str = "local"  # "local" | "s3"
     # Render (and many PaaS) run your code from a read-only source directory.
     # Use /tmp by default, you can override with STORAGE_LOCAL_DIR.
     STORAGE_LOCAL_DIR: str = "/tmp/revista_storage"
+    # Upload limits (bytes), enforced on the request body (app.api.uploads) and while
+    # streaming to disk.
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    PDF_IMPORT_MAX_BYTES: int = 300 * 1024 * 1024
+    # PDF import process pool: 0 = one worker per CPU, 1 = import in-process.
+    PDF_IMPORT_WORKERS: int = 0
+    # Smaller documents are imported in-process (pool start-up costs more than it saves).
+    PDF_IMPORT_PARALLEL_MIN_PAGES: int = 8
+    # Resolved storage paths remembered per process (services.storage).
+    PATH_CACHE_SIZE: int = 4096
+    # Source PDFs kept open per process for on-demand overlay detection.
+    PDF_DOC_CACHE_SIZE: int = 8
+    # Import budgets: longer documents are rejected up front, and page renders or
+    # embedded images over the pixel budget are scaled down / left undecoded.
+    PDF_IMPORT_MAX_PAGES: int = 500
+    PDF_IMPORT_MAX_PIXELS: int = 16_000_000
+    # Finished imports are reused for byte-identical uploads; entries expire this many
+    # days after their last use (0 disables the cache).
+    PDF_IMPORT_CACHE_DAYS: int = 30
+
+    # S3-compatible object storage (STORAGE_MODE=s3), e.g. MinIO in dev.
+    S3_ENDPOINT: str = ""
+    S3_PUBLIC_ENDPOINT: str = ""  # endpoint reachable by browsers, used to sign download URLs
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_BUCKET: str = "magazine"
+    S3_REGION: str = "us-east-1"
+    S3_PRESIGN_EXPIRE_SEC: int = 3600
+    # Local copies of S3 objects (PyMuPDF/Pillow need files), under STORAGE_LOCAL_DIR/.cache.
+    S3_CACHE_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+    # Redirect downloads to presigned URLs when the backend supports them.
+    STORAGE_PRESIGNED_DOWNLOADS: bool = True
+
+    # Asset garbage collection: unreferenced files are only removed once they have
+    # been unused for the grace period. Exported PDFs are kept for EXPORT_RETENTION_DAYS.
+    ASSET_GC_GRACE_HOURS: int = 48
+    EXPORT_RETENTION_DAYS: int = 7
+
+    # Resized/WebP image variants (?w=&fmt=) are cached under STORAGE_LOCAL_DIR/.cache.
+    DERIVATIVE_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Page rasters / tiles of stored PDFs (imported page backgrounds), same cache dir.
+    RASTER_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Decoded inline (data URI) template images, kept in memory per process.
+    DATA_URI_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Images resampled to the export profile's resolution (web/print), same cache dir.
+    EXPORT_IMAGE_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Rendered export pages (single-page PDFs keyed by page content), same cache dir.
+    EXPORT_PAGE_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Export process pool: 0 = one worker per CPU, 1 = render in-process. Only used when
+    # at least EXPORT_PARALLEL_MIN_PAGES pages need rendering (not in the page cache).
+    # Off by default until its scaling is measured on the deployment (scripts/bench_export.py).
+    EXPORT_WORKERS: int = 1
+    EXPORT_PARALLEL_MIN_PAGES: int = 16
 
     SUPERADMIN_EMAIL: str = ""
     SUPERADMIN_PASSWORD: str = ""
@@ -2,7 +2,7 @@ from __future__ import annotations
 import json
 from typing import Dict, Any
 from sqlalchemy.orm import Session
-from app.models.models import Project, Club
+from app.models.models import Project, Club, ExportRecord
 from app.services.pdf_exporter import export_document_to_pdf
 from app.services.storage import save_local_file
 
@@ -18,13 +18,6 @@ def export_project_job(project_id: str, club_id: str, payload: Dict[str, Any], d
         if not proj or not club:
             return {"ok": False, "error": "Project/Club not found"}
         doc = json.loads(proj.document_json)
-        locked = club.locked_logo_asset_id
-        if locked:
-            for p in doc.get("pages", [])[:1]:
-                for layer in p.get("layers", []):
-                    for it in layer.get("items", []):
-                        if it.get("type")=="LockedLogoStamp" and str(it.get("assetRef","")).startswith("{{"):
-                            it["assetRef"] = locked
         # Exporter resolves Asset ids via DB, so no resolver callback is needed here.
         # Print options like bleed/crop are intentionally ignored for now.
         pdf_bytes = export_document_to_pdf(
@@ -32,8 +25,53 @@ def export_project_job(project_id: str, club_id: str, payload: Dict[str, Any], d
             doc,
             quality=payload.get("quality", "web"),
             watermark=bool(payload.get("watermark", False)),
+            locked_logo_asset_id=club.locked_logo_asset_id,
         )
-        export_id, _ = save_local_file(pdf_bytes, f"{proj.name}.pdf")
+        export_id, _ = save_local_file(pdf_bytes, f"{proj.name}.pdf", content_type="application/pdf")
+        # Recorded so the asset GC keeps the PDF for EXPORT_RETENTION_DAYS.
+        db.add(ExportRecord(id=export_id, project_id=proj.id, club_id=club.id, size=len(pdf_bytes)))
+        db.commit()
         return {"ok": True, "export_asset_id": export_id}
     finally:
         db.close()
+
+
+def import_pdf_job(project_id: str, source_asset_id: str, db_url: str):
+    """Import (or resume) the pending pages of an import project, page by page.
+
+    Progress is reported in job.meta; finished pages are persisted as they complete
+    (see services.import_runner).
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from rq import get_current_job
+    from app.services.blob_store import get_asset_path
+    from app.services.import_runner import run_pdf_import
+    engine = create_engine(db_url, pool_pre_ping=True)
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    db: Session = SessionLocal()
+    job = get_current_job()
+
+    def progress(done: int, total: int):
+        if job is not None:
+            job.meta["progress"] = {"pages_done": done, "pages_total": total}
+            job.save_meta()
+
+    try:
+        pdf_path = get_asset_path(db, source_asset_id)
+        return {"ok": True, **run_pdf_import(db, project_id, pdf_path, progress)}
+    finally:
+        db.close()
+
+
+def gc_assets_job(db_url: str, grace_hours: int | None = None, dry_run: bool = False):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.services.asset_gc import collect_garbage
+    engine = create_engine(db_url, pool_pre_ping=True)
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    db: Session = SessionLocal()
+    try:
+        return {"ok": True, **collect_garbage(db, grace_hours=grace_hours, dry_run=dry_run)}
+    finally:
+        db.close()
@@ -18,6 +18,7 @@ from app.api.routes.admin import router as admin_router
 from app.core.migrations import ensure_schema
 from app.services.superadmin import ensure_super_admin
 from app.services.catalog_seed import ensure_catalog_seeded
+from app.services.storage import migrate_flat_layout
 
 logger = logging.getLogger("magazine")
 
@@ -56,6 +57,10 @@ def create_app() -> FastAPI:
         if last_err is not None:
             raise last_err
 
+        moved = migrate_flat_layout()
+        if moved:
+            logger.info("Moved %d stored files into the sharded storage layout.", moved)
+
         db = SessionLocal()
         try:
             ensure_catalog_seeded(db)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text, Integer
+from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text, Integer, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.db import Base
 
@@ -78,5 +78,39 @@ class Asset(Base):
     filename: Mapped[str] = mapped_column(String(255))
     mime: Mapped[str] = mapped_column(String(128))
     storage_path: Mapped[str] = mapped_column(String(512))
+    # Content-addressed blob (sha256) backing this asset; NULL for legacy uuid-named files.
+    blob_id: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
     is_catalog: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    # sha256 hex of the content; also the storage key of the file on disk.
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ext: Mapped[str] = mapped_column(String(16), default=".bin")
+    size: Mapped[int] = mapped_column(BigInteger, default=0)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Bumped on every acquire/release; the garbage collector's grace period starts here.
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ExportRecord(Base):
+    __tablename__ = "exports"
+    # Storage key of the exported PDF (as returned to the client as export_asset_id).
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(32), index=True)
+    club_id: Mapped[str] = mapped_column(String(32), index=True)
+    size: Mapped[int] = mapped_column(BigInteger, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ImportResult(Base):
+    __tablename__ = "import_results"
+    # sha256 of (source PDF sha256, mode, preset, render settings); see services.import_cache.
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    source_blob_id: Mapped[str] = mapped_column(String(64), index=True)
+    # Imported document and the assets it references ({"id","sha","size","filename","mime"}).
+    # The entry holds a reference on each blob, so they outlive the projects made from it.
+    document_json: Mapped[str] = mapped_column(Text)
+    assets_json: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Set
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.models import Asset, Blob, Club, ExportRecord, Project, Template
+from app.services.blob_store import release_blob
+from app.services.import_cache import expire_import_results
+from app.services.storage import delete_object, iter_objects
+
+logger = logging.getLogger("magazine")
+
+# Anything that looks like a stored id (uuid hex asset ids, sha256 blob ids).
+_ID_RE = re.compile(r"^[0-9a-f]{32}$|^[0-9a-f]{64}$")
+_BATCH = 500
+
+
+def _collect_refs(node: Any, out: Set[str]) -> None:
+    """Collect every id-looking string in a document.
+
+    Deliberately conservative: documents reference assets from assetRef, meta
+    (source_pdf_asset_id, ...) and editor-specific keys, so any matching string
+    keeps its asset alive.
+    """
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            stack.extend(cur.values())
+        elif isinstance(cur, list):
+            stack.extend(cur)
+        elif isinstance(cur, str) and _ID_RE.match(cur):
+            out.add(cur)
+
+
+def _collect_json_refs(rows: Iterable[Any], out: Set[str]) -> None:
+    for (raw,) in rows:
+        try:
+            _collect_refs(json.loads(raw or "{}"), out)
+        except Exception:
+            continue
+
+
+def build_reference_index(db: Session) -> Set[str]:
+    """Ids referenced by projects, templates, club logos and export records."""
+    refs: Set[str] = set()
+    _collect_json_refs(db.query(Project.document_json).yield_per(50), refs)
+    _collect_json_refs(db.query(Template.document_json).yield_per(20), refs)
+    for (logo,) in db.query(Club.locked_logo_asset_id).filter(Club.locked_logo_asset_id.isnot(None)):
+        refs.add(logo)
+    for (export_id,) in db.query(ExportRecord.id):
+        refs.add(export_id)
+    return refs
+
+
+def _stem(key: str) -> str:
+    return os.path.splitext(key.rsplit("/", 1)[-1])[0]
+
+
+def collect_garbage(db: Session, grace_hours: int | None = None, dry_run: bool = False) -> Dict[str, Any]:
+    """Delete unreferenced assets, blobs and stored files older than the grace period.
+
+    1. Export records past EXPORT_RETENTION_DAYS and import cache entries unused for
+       PDF_IMPORT_CACHE_DAYS are dropped.
+    2. Non-catalog Asset rows not referenced anywhere are deleted; their blob loses a reference.
+    3. Blobs without references, unused for the grace period, are deleted with their file.
+    4. Stored files that no row knows about (legacy uuid files, old exports, leftovers
+       of failed imports) are deleted once their mtime is older than the grace period.
+
+    Returns a report with counts and reclaimed bytes.
+    """
+    started = time.time()
+    grace = timedelta(hours=settings.ASSET_GC_GRACE_HOURS if grace_hours is None else grace_hours)
+    now = datetime.utcnow()
+    cutoff = now - grace
+    report: Dict[str, Any] = {
+        "exports_expired": 0,
+        "import_results_expired": 0,
+        "assets_deleted": 0,
+        "blobs_deleted": 0,
+        "files_deleted": 0,
+        "bytes_reclaimed": 0,
+        "dry_run": dry_run,
+    }
+
+    # 1) Expire old export records (their PDFs become unreferenced files).
+    export_cutoff = now - timedelta(days=settings.EXPORT_RETENTION_DAYS)
+    expired = db.query(ExportRecord).filter(ExportRecord.created_at < export_cutoff).count()
+    report["exports_expired"] = expired
+    if expired and not dry_run:
+        db.execute(delete(ExportRecord).where(ExportRecord.created_at < export_cutoff))
+        db.commit()
+    # Cached import results hold blob references: release them before step 3.
+    report["import_results_expired"] = expire_import_results(db, dry_run=dry_run)
+
+    # 2) Unreferenced asset rows.
+    refs = build_reference_index(db)
+    rows = (
+        db.query(Asset.id, Asset.storage_path, Asset.blob_id)
+        .filter(Asset.is_catalog == False)  # noqa: E712
+        .filter(Asset.created_at < cutoff)
+    )
+    doomed = [(aid, blob_id) for aid, sp, blob_id in rows if aid not in refs and (sp or "") not in refs]
+    doomed_ids = {aid for aid, _blob_id in doomed}
+    report["assets_deleted"] = len(doomed)
+    if not dry_run:
+        for i in range(0, len(doomed), _BATCH):
+            batch = doomed[i:i + _BATCH]
+            for _aid, blob_id in batch:
+                release_blob(db, blob_id)
+            db.execute(delete(Asset).where(Asset.id.in_([aid for aid, _blob_id in batch])))
+            db.commit()
+
+    # 3) Blobs without references that have been unused for the grace period.
+    dead_ids = {
+        bid
+        for (bid,) in db.query(Blob.id).filter(Blob.ref_count <= 0).filter(Blob.last_used_at < cutoff)
+    }
+
+    # 4) Walk the store once: delete dead blobs and files nobody knows about.
+    known: Set[str] = set(refs)
+    for (aid, sp, blob_id) in db.query(Asset.id, Asset.storage_path, Asset.blob_id):
+        if aid in doomed_ids:
+            continue
+        known.add(_stem(sp or ""))
+        if blob_id:
+            known.add(blob_id)
+    for (blob_id,) in db.query(Blob.id):
+        if blob_id not in dead_ids:
+            known.add(blob_id)
+
+    cutoff_ts = started - grace.total_seconds()
+    for key, size, mtime in iter_objects():
+        stem = _stem(key)
+        if stem in dead_ids:
+            if not dry_run:
+                # Re-check under the row: a concurrent upload may have re-acquired it.
+                res = db.execute(delete(Blob).where(Blob.id == stem, Blob.ref_count <= 0))
+                if not res.rowcount:
+                    db.rollback()
+                    continue
+                # The file goes before the row delete commits: an upload acquiring the
+                # blob meanwhile waits on the row, then finds no file and stores it again.
+                delete_object(key)
+                db.commit()
+            report["blobs_deleted"] += 1
+            report["bytes_reclaimed"] += size
+        elif stem not in known and mtime < cutoff_ts:
+            if not dry_run:
+                delete_object(key)
+            report["files_deleted"] += 1
+            report["bytes_reclaimed"] += size
+
+    # Rows of dead blobs whose file was already gone.
+    if not dry_run:
+        db.execute(delete(Blob).where(Blob.id.in_(dead_ids), Blob.ref_count <= 0))
+        db.commit()
+
+    # Temp files of interrupted uploads.
+    incoming = os.path.join(settings.STORAGE_LOCAL_DIR, ".incoming")
+    if os.path.isdir(incoming):
+        for entry in os.scandir(incoming):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+                    report["bytes_reclaimed"] += entry.stat().st_size
+                    if not dry_run:
+                        os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+    report["seconds"] = round(time.time() - started, 2)
+    logger.info("Asset GC: %s", report)
+    return report
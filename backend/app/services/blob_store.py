@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import uuid
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.models import Asset, Blob
+from app.services.storage import AcquireFn, get_backend, get_local_path, store_blob, store_blob_stream
+
+# Content-addressed assets
+# ------------------------
+# Bytes are stored once per SHA-256 (see storage.store_blob). Every Asset row that
+# uses them points at the shared Blob row, which keeps a reference count, so the same
+# sponsor logo uploaded by many clubs (or the same image extracted from every page of
+# an import) costs one disk write.
+
+
+class MissingBlobs(RuntimeError):
+    """Stored files that were garbage collected before a reference to them was taken."""
+
+    def __init__(self, shas: List[str]):
+        super().__init__(f"{len(shas)} stored file(s) were deleted before use")
+        self.shas = shas
+
+
+def acquire_blob(db: Session, sha: str, ext: str, size: int, count: int = 1) -> None:
+    """Register `count` more references to a blob, creating its row if needed."""
+    bump = update(Blob).where(Blob.id == sha).values(ref_count=Blob.ref_count + count, last_used_at=datetime.utcnow())
+    res = db.execute(bump)
+    if res.rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(Blob(id=sha, ext=ext, size=size, ref_count=count))
+    except IntegrityError:
+        # Created concurrently by another request.
+        db.execute(bump)
+
+
+def release_blob(db: Session, blob_id: Optional[str]) -> None:
+    """Drop one reference to a blob. Files are only removed by the garbage collector."""
+    if not blob_id:
+        return
+    db.execute(
+        update(Blob)
+        .where(Blob.id == blob_id, Blob.ref_count > 0)
+        .values(ref_count=Blob.ref_count - 1, last_used_at=datetime.utcnow())
+    )
+
+
+def _acquire_for(db: Session, filename: str) -> AcquireFn:
+    """AcquireFn taking one reference for an upload named `filename`."""
+    ext = os.path.splitext(filename)[1].lower() or ".bin"
+    return lambda sha, size: acquire_blob(db, sha, ext, size)
+
+
+def _new_asset(
+    db: Session,
+    sha: str,
+    filename: str,
+    mime: str,
+    club_id: Optional[str],
+    is_catalog: bool,
+) -> Asset:
+    # The blob reference was taken while storing (see storage.AcquireFn).
+    asset = Asset(
+        id=uuid.uuid4().hex,
+        club_id=club_id,
+        filename=filename,
+        mime=mime,
+        storage_path=sha,
+        blob_id=sha,
+        is_catalog=is_catalog,
+    )
+    db.add(asset)
+    return asset
+
+
+def save_asset(
+    db: Session,
+    content: bytes,
+    filename: str,
+    mime: str,
+    club_id: Optional[str] = None,
+    is_catalog: bool = False,
+) -> Asset:
+    """Store bytes (deduplicated) and add a new Asset row pointing at them.
+
+    The caller commits, like the rest of the services.
+    """
+    sha, _path, _created = store_blob(content, filename, content_type=mime, acquire=_acquire_for(db, filename))
+    return _new_asset(db, sha, filename, mime, club_id, is_catalog)
+
+
+def save_asset_stream(
+    db: Session,
+    fileobj: BinaryIO,
+    filename: str,
+    mime: str,
+    club_id: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+) -> Asset:
+    """Like save_asset, but streams the content from a file object in chunks."""
+    sha, _path, _size, _created = store_blob_stream(fileobj, filename, max_bytes=max_bytes, content_type=mime,
+                                                    acquire=_acquire_for(db, filename))
+    return _new_asset(db, sha, filename, mime, club_id, False)
+
+
+def add_assets_bulk(db: Session, specs: List[Dict[str, Any]], club_id: Optional[str] = None) -> List[str]:
+    """Insert Asset rows for blobs that are already stored, in one statement.
+
+    Each spec carries {"id", "sha", "size", "filename", "mime"} (see
+    pdf_importer.AssetSink). Blob references are counted once per distinct hash.
+    Returns the asset ids in input order; the caller commits.
+
+    The files were stored before any reference was taken (page workers have no
+    database), so the garbage collector may have deleted one that belonged to a dead
+    blob meanwhile. Each file is checked once its reference is held; missing ones
+    raise MissingBlobs, and the caller rolls back and stores them again.
+    """
+    if not specs:
+        return []
+    per_blob: Dict[str, List[Dict[str, Any]]] = {}
+    for spec in specs:
+        per_blob.setdefault(spec["sha"], []).append(spec)
+    for sha in sorted(per_blob):  # stable lock order between concurrent imports
+        group = per_blob[sha]
+        ext = os.path.splitext(group[0]["filename"])[1].lower() or ".bin"
+        acquire_blob(db, sha, ext, group[0]["size"], count=len(group))
+    backend = get_backend()
+    missing = [sha for sha in sorted(per_blob) if not backend.find(sha)]
+    if missing:
+        raise MissingBlobs(missing)
+    db.execute(
+        insert(Asset),
+        [
+            {
+                "id": spec["id"],
+                "club_id": club_id,
+                "filename": spec["filename"],
+                "mime": spec["mime"],
+                "storage_path": spec["sha"],
+                "blob_id": spec["sha"],
+                "is_catalog": False,
+            }
+            for spec in specs
+        ],
+    )
+    return [spec["id"] for spec in specs]
+
+
+def replace_asset_content(
+    db: Session,
+    asset: Asset,
+    fileobj: BinaryIO,
+    filename: str,
+    mime: str,
+    max_bytes: Optional[int] = None,
+) -> Asset:
+    """Point an existing Asset at new (streamed) bytes, keeping its id."""
+    acquire = _acquire_for(db, filename)
+    # Unchanged bytes keep the asset's own reference.
+    sha, _path, _size, _created = store_blob_stream(
+        fileobj, filename, max_bytes=max_bytes, content_type=mime,
+        acquire=lambda sha, size: None if sha == asset.blob_id else acquire(sha, size),
+    )
+    if sha != asset.blob_id:
+        release_blob(db, asset.blob_id)
+    asset.filename = filename
+    asset.mime = mime
+    asset.storage_path = sha
+    asset.blob_id = sha
+    db.add(asset)
+    return asset
+
+
+def get_asset_path(db: Session, asset_ref: str) -> str:
+    """Resolve an Asset id (or a raw storage key/path, for older documents) to a local path."""
+    a = db.get(Asset, str(asset_ref))
+    if a:
+        return get_local_path(a.storage_path)
+    return get_local_path(str(asset_ref))
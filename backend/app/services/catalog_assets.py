@@ -6,7 +6,7 @@ from PIL import Image, ImageDraw, ImageFont
 
 from sqlalchemy.orm import Session
 from app.models.models import Asset
-from app.services.storage import save_local_file
+from app.services.blob_store import save_asset
 
 # Simple, copyright-safe placeholder assets that look "editorial".
 # These are NOT real photos; they are generated compositions.
@@ -105,11 +105,8 @@ def ensure_catalog_assets(db: Session) -> Dict[str, List[str]]:
     accents = [(91,140,255),(255,77,109),(45,212,191),(226,183,20),(155,116,255)]
     # create a few per pool
     def add_asset(name: str, content: bytes) -> str:
-        # Use the same id for DB + disk so any consumer (editor/exporter) can resolve paths reliably.
-        asset_id, _path = save_local_file(content, f"{name}.png")
-        a = Asset(id=asset_id, club_id=None, filename=f"{name}.png", mime="image/png", storage_path=asset_id, is_catalog=True)
-        db.add(a)
-        return asset_id
+        a = save_asset(db, content, f"{name}.png", "image/png", club_id=None, is_catalog=True)
+        return a.id
 
     for i in range(6):
         pools["hero_football"].append(add_asset(f"hero-football-{i+1}", _hero("football", accents[i % len(accents)])))
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from PIL import Image
+
+from app.core.settings import settings
+
+# Inline images
+# -------------
+# Generated templates carry their placeholder images inline as data URIs, and the same
+# string repeats on many pages. Both the PDF exporter and the template thumbnailer
+# decode them through this process-wide cache, keyed by a hash of the URI: each one is
+# base64-decoded (and PIL-decoded, when asked) once. Bounded by
+# DATA_URI_CACHE_MAX_BYTES, least recently used first out.
+
+_DATA_URI_RE = re.compile(r"data:(image/[\w.+-]+);base64,", re.IGNORECASE)
+# Formats both users can place (SVG and friends are left to the browser).
+RASTER_MIMES = ("image/png", "image/jpeg", "image/jpg")
+
+
+class InlineImage:
+    def __init__(self, digest: str, mime: str, data: bytes):
+        self.digest = digest
+        self.mime = mime
+        self.data = data
+        self._image: Optional[Image.Image] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + (self._image.width * self._image.height * 4 if self._image is not None else 0)
+
+    def image(self) -> Image.Image:
+        """Decoded RGBA image, shared by every user of the cache: do not modify it."""
+        if self._image is None:
+            with Image.open(io.BytesIO(self.data)) as im:
+                self._image = im.convert("RGBA")
+            _cache.account()
+        return self._image
+
+
+class _InlineImageCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, InlineImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, uri: str) -> Optional[InlineImage]:
+        m = _DATA_URI_RE.match(uri)
+        if not m:
+            return None
+        digest = hashlib.sha1(uri.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                return entry
+        try:
+            data = base64.b64decode(uri[m.end():])
+        except ValueError:
+            return None
+        entry = InlineImage(digest, m.group(1).lower(), data)
+        with self._lock:
+            self._entries[digest] = entry
+        self.account()
+        return entry
+
+    def account(self) -> None:
+        with self._lock:
+            self._bytes = sum(e.size for e in self._entries.values())
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _digest, old = self._entries.popitem(last=False)
+                self._bytes -= old.size
+
+
+_cache = _InlineImageCache(settings.DATA_URI_CACHE_MAX_BYTES)
+
+
+def inline_image(uri: str) -> Optional[InlineImage]:
+    """The decoded image of a base64 data:image/... URI (None if it isn't one)."""
+    return _cache.get(uri)
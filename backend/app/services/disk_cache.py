@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from typing import Optional
+
+from app.core.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: size updates are unlocked there, so only approximate
+    fcntl = None
+
+# Running total of the cache's bytes, shared by every process using it (API workers,
+# RQ job forks, export pool workers), so none of them has to walk the whole tree to
+# learn it. Missing or unreadable means "unknown": the next put measures it.
+_SIZE_FILE = ".size"
+
+
+class DiskCache:
+    """Size-bounded on-disk cache of derived files (LRU by mtime).
+
+    Lives under STORAGE_LOCAL_DIR/.cache/<name>, sharded like the storage layout.
+    Entries are touched on every hit; when the cache grows past max_bytes the least
+    recently used entries are evicted down to 90% of the budget. The size is tracked
+    in a small file next to the entries, updated under a file lock. Everything in
+    here can be regenerated, so it is safe to wipe at any time.
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        return os.path.join(settings.STORAGE_LOCAL_DIR, ".cache", self.name)
+
+    def path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}{ext}")
+
+    def get(self, key: str, ext: str) -> Optional[str]:
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_bytes(self, key: str, ext: str, data: bytes) -> str:
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        replaced = self._size_of(path)
+        os.replace(tmp, path)
+        self._account(len(data) - replaced)
+        return path
+
+    def put_file(self, key: str, ext: str, src_path: str) -> str:
+        """Move a finished local file into the cache (it must be on the same filesystem)."""
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced = self._size_of(path)
+        os.replace(src_path, path)
+        self._account(os.path.getsize(path) - replaced)
+        return path
+
+    @staticmethod
+    def _size_of(path: str) -> int:
+        # Size of an entry about to be overwritten: only the difference is new.
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _account(self, added: int) -> None:
+        fd = os.open(os.path.join(self.root, _SIZE_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._lock, open(fd, "r+", encoding="ascii") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            raw = f.read().strip()
+            # A fresh scan already includes the entry just added.
+            total = max(0, int(raw) + added) if raw.isdigit() else self._scan_size()
+            if total > self.max_bytes:
+                total = self._evict()
+            f.seek(0)
+            f.truncate()
+            f.write(str(total))
+
+    def _entries(self):
+        for dirpath, _dirs, files in os.walk(self.root):
+            for fn in files:
+                if fn.endswith(".part") or fn == _SIZE_FILE:
+                    continue
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                yield p, st.st_size, st.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _p, size, _m in self._entries())
+
+    def _evict(self) -> int:
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _p, size, _m in entries)
+        target = int(self.max_bytes * 0.9)
+        for p, size, _m in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except FileNotFoundError:
+                continue
+        return total
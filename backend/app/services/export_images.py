@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.settings import settings
+from app.services.disk_cache import DiskCache
+from app.services.image_derivatives import encode_image
+
+# Images placed in exported PDFs, resampled to what each frame needs
+# ------------------------------------------------------------------
+# A frame w x h points wide shows w/72 x h/72 inches of image: at the profile's DPI it
+# needs that many pixels, nothing more. Larger images (and cropped ones) are cut to
+# the crop, downsampled and re-encoded (JPEG for photos, PNG/Flate for flat art and
+# transparency); smaller ones are embedded as they are, never upscaled. Variants are
+# cached by (content id, pixel size, crop, profile) like image derivatives.
+
+# quality -> (effective DPI, JPEG quality)
+PROFILES: Dict[str, Tuple[int, int]] = {
+    "web": (96, 80),
+    "print": (300, 90),
+}
+# Pixel sizes are rounded up to this step so near-identical frames share a variant.
+SIZE_STEP = 32
+# Images at most this much larger than needed are not worth re-encoding.
+_SLACK = 1.25
+# Flat artwork (logos, charts) has few colours: Flate keeps it crisp, JPEG would smear it.
+_FLAT_COLORS = 256
+
+_EXIF_ORIENTATION = 0x0112
+
+_cache = DiskCache("export_images", settings.EXPORT_IMAGE_CACHE_MAX_BYTES)
+
+
+def export_profile(quality: Optional[str]) -> Tuple[int, int]:
+    return PROFILES.get((quality or "web").lower(), PROFILES["web"])
+
+
+def target_size(width_pt: float, height_pt: float, dpi: int) -> Tuple[int, int]:
+    """Pixels a frame of this size needs at `dpi`, rounded up to SIZE_STEP."""
+    def px(pt: float) -> int:
+        n = max(1, math.ceil(abs(pt) / 72 * dpi))
+        return -(-n // SIZE_STEP) * SIZE_STEP
+    return px(width_pt), px(height_pt)
+
+
+def crop_fractions(crop: Any) -> Optional[Tuple[float, float, float, float]]:
+    """(left, top, right, bottom) of a frame's crop as fractions, None for the whole image."""
+    if not isinstance(crop, dict):
+        return None
+    try:
+        x = min(max(float(crop.get("x", 0)), 0.0), 1.0)
+        y = min(max(float(crop.get("y", 0)), 0.0), 1.0)
+        r = min(max(x + float(crop.get("w", 1)), x), 1.0)
+        b = min(max(y + float(crop.get("h", 1)), y), 1.0)
+    except (TypeError, ValueError):
+        return None
+    if r - x <= 0 or b - y <= 0 or (x, y, r, b) == (0.0, 0.0, 1.0, 1.0):
+        return None
+    return round(x, 4), round(y, 4), round(r, 4), round(b, 4)
+
+
+def _is_flat(im: Image.Image) -> bool:
+    probe = im.convert("RGB")
+    probe.thumbnail((128, 128))
+    return probe.getcolors(_FLAT_COLORS) is not None
+
+
+def render_export_image(
+    source_path: str,
+    size: Tuple[int, int],
+    crop: Optional[Tuple[float, float, float, float]],
+    jpeg_quality: int,
+) -> Tuple[bytes, str]:
+    """Cut `crop` out of the image and fit it within `size` pixels: (encoded bytes, fmt)."""
+    with Image.open(source_path) as im:
+        l, t, r, b = crop or (0.0, 0.0, 1.0, 1.0)
+        need = (math.ceil(size[0] / (r - l)), math.ceil(size[1] / (b - t)))
+        if im.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8):  # stored rotated 90°
+            need = need[::-1]
+        # draft() lets JPEG decoding skip straight to a reduced scale.
+        im.draft("RGB", need)
+        im = ImageOps.exif_transpose(im)
+        box = (l * im.width, t * im.height, r * im.width, b * im.height)
+        out = (min(size[0], max(1, round(box[2] - box[0]))), min(size[1], max(1, round(box[3] - box[1]))))
+        if im.mode not in ("RGB", "RGBA", "L", "LA"):
+            im = im.convert("RGBA" if "transparency" in im.info or im.mode == "PA" else "RGB")
+        im = im.resize(out, Image.LANCZOS, box=box, reducing_gap=3.0)
+        has_alpha = im.mode in ("RGBA", "LA") and im.getchannel("A").getextrema()[0] < 255
+        fmt = "png" if has_alpha or _is_flat(im) else "jpeg"
+        if not has_alpha and im.mode == "RGBA":
+            im = im.convert("RGB")
+        return encode_image(im, fmt, jpeg_quality), fmt
+
+
+def get_export_image(
+    source_path: str,
+    content_id: str,
+    size: Tuple[int, int],
+    crop: Optional[Tuple[float, float, float, float]],
+    quality: Optional[str],
+) -> str:
+    """Path of the file to embed for a frame needing `size` pixels of the image.
+
+    That is the original when it is already about that size (and uncropped), else a
+    cached resampled variant. Images PIL can't read are left to PyMuPDF as they are.
+    """
+    dpi, jpeg_quality = export_profile(quality)
+    crop_id = "" if crop is None else "_c" + "-".join(f"{v:g}" for v in crop)
+    key = f"{content_id}_{size[0]}x{size[1]}{crop_id}_d{dpi}q{jpeg_quality}"
+    for ext in (".jpg", ".png"):
+        hit = _cache.get(key, ext)
+        if hit:
+            return hit
+    try:
+        with Image.open(source_path) as im:
+            upright = im.getexif().get(_EXIF_ORIENTATION, 1) == 1
+            if crop is None and upright and im.width <= size[0] * _SLACK and im.height <= size[1] * _SLACK:
+                return source_path
+        data, fmt = render_export_image(source_path, size, crop, jpeg_quality)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return source_path
+    # A "resampled" file that isn't smaller than the original is not worth keeping.
+    if crop is None and upright and len(data) >= os.path.getsize(source_path):
+        return source_path
+    return _cache.put_bytes(key, ".jpg" if fmt == "jpeg" else ".png", data)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import io
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from app.core.settings import settings
+from app.services.disk_cache import DiskCache
+
+# Resized variants of stored images, generated once and cached by
+# (content id, width, format). Content ids are blob hashes (or immutable legacy
+# ids), so a cached variant never goes stale.
+
+FORMATS: Dict[str, Tuple[str, str, str]] = {
+    # fmt -> (PIL format, mime, extension)
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "jpg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+MIN_WIDTH, MAX_WIDTH = 16, 4096
+# Widths are rounded up to this step so arbitrary ?w= values can't flood the cache.
+WIDTH_STEP = 50
+
+_cache = DiskCache("derivatives", settings.DERIVATIVE_CACHE_MAX_BYTES)
+
+
+def normalize_width(width: int) -> int:
+    w = max(MIN_WIDTH, min(int(width), MAX_WIDTH))
+    return min(MAX_WIDTH, -(-w // WIDTH_STEP) * WIDTH_STEP)
+
+
+def encode_image(im: Image.Image, fmt: str, quality: int = 80) -> bytes:
+    pil_fmt, _mime, _ext = FORMATS[fmt]
+    has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+    if pil_fmt == "JPEG" or not has_alpha:
+        im = im.convert("RGB")
+    else:
+        im = im.convert("RGBA")
+    buf = io.BytesIO()
+    if pil_fmt == "PNG":
+        im.save(buf, format=pil_fmt, optimize=True)
+    elif pil_fmt == "WEBP":
+        im.save(buf, format=pil_fmt, quality=quality, method=4)
+    else:
+        im.save(buf, format=pil_fmt, quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def render_derivative(source_path: str, width: Optional[int], fmt: str, quality: int = 80) -> bytes:
+    with Image.open(source_path) as im:
+        if width:
+            # draft() lets JPEG decoding skip straight to a reduced scale.
+            im.draft("RGB", (width, max(1, int(im.height * width / max(1, im.width)))))
+            if im.width > width:
+                im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        return encode_image(im, fmt, quality)
+
+
+def get_derivative(source_path: str, content_id: str, width: Optional[int], fmt: str = "webp") -> Tuple[str, str]:
+    """Return (path, mime) of a cached resized variant, generating it on first use."""
+    fmt = (fmt or "webp").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    w = normalize_width(width) if width else None
+    _pil_fmt, mime, ext = FORMATS[fmt]
+    key = f"{content_id}_w{w or 0}"
+    hit = _cache.get(key, ext)
+    if hit:
+        return hit, mime
+    data = render_derivative(source_path, w, fmt)
+    return _cache.put_bytes(key, ext, data), mime
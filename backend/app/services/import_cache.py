@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.models import ImportResult
+from app.services.blob_store import acquire_blob, add_assets_bulk, release_blob
+from app.services.pdf_importer import IMPORT_VERSION
+
+# Import result cache
+# -------------------
+# Clubs often upload the same PDF again (a second project, a retry after a bad edit).
+# A finished import is remembered by the hash of the source bytes plus everything that
+# changes the output (mode, preset, render scale and pixel budget, importer version).
+# A repeat import clones the stored document and adds Asset rows pointing at the same
+# blobs: no page is opened or rendered.
+#
+# Entries hold one reference on each blob they use and expire PDF_IMPORT_CACHE_DAYS
+# after their last use (see expire_import_results, run by the asset GC).
+
+
+def import_cache_key(source_sha: str, mode: str, preset: str) -> str:
+    scale = os.getenv("PDF_IMPORT_SCALE", "1.25")
+    raw = f"{source_sha}|{mode}|{preset}|{scale}|{settings.PDF_IMPORT_MAX_PIXELS}|{IMPORT_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _enabled() -> bool:
+    return settings.PDF_IMPORT_CACHE_DAYS > 0
+
+
+def _remap(node: Any, ids: Dict[str, str]) -> Any:
+    if isinstance(node, dict):
+        return {k: _remap(v, ids) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_remap(v, ids) for v in node]
+    if isinstance(node, str):
+        return ids.get(node, node)
+    return node
+
+
+def store_import_result(
+    db: Session,
+    key: str,
+    source_sha: str,
+    document: Dict[str, Any],
+    specs: List[Dict[str, Any]],
+) -> None:
+    """Remember a finished import (`specs`: the assets its document references).
+
+    The caller commits. A concurrent import of the same PDF may have stored it first;
+    then this one is dropped.
+    """
+    if not _enabled() or not source_sha:
+        return
+    try:
+        with db.begin_nested():
+            db.add(ImportResult(
+                id=key,
+                source_blob_id=source_sha,
+                document_json=json.dumps(document, ensure_ascii=False),
+                assets_json=json.dumps(specs),
+            ))
+            db.flush()
+            for sha in sorted({s["sha"] for s in specs}):
+                spec = next(s for s in specs if s["sha"] == sha)
+                acquire_blob(db, sha, os.path.splitext(spec["filename"])[1].lower() or ".bin", spec["size"])
+    except IntegrityError:
+        pass
+
+
+def clone_import_result(db: Session, key: str, club_id: str) -> Optional[Dict[str, Any]]:
+    """A copy of a cached import for `club_id`, with its own Asset rows, or None.
+
+    The caller commits.
+    """
+    if not _enabled():
+        return None
+    entry = db.get(ImportResult, key)
+    if entry is None:
+        return None
+    specs = json.loads(entry.assets_json or "[]")
+    ids = {s["id"]: uuid.uuid4().hex for s in specs}
+    add_assets_bulk(db, [{**s, "id": ids[s["id"]]} for s in specs], club_id=club_id)
+    document = _remap(json.loads(entry.document_json), ids)
+    document["id"] = str(uuid.uuid4())
+    entry.last_used_at = datetime.utcnow()
+    return document
+
+
+def expire_import_results(db: Session, dry_run: bool = False) -> int:
+    """Drop entries unused for PDF_IMPORT_CACHE_DAYS, releasing their blobs."""
+    cutoff = datetime.utcnow() - timedelta(days=max(0, settings.PDF_IMPORT_CACHE_DAYS))
+    expired = db.query(ImportResult).filter(ImportResult.last_used_at < cutoff).all()
+    if dry_run:
+        return len(expired)
+    for entry in expired:
+        for sha in {s["sha"] for s in json.loads(entry.assets_json or "[]")}:
+            release_blob(db, sha)
+        db.execute(delete(ImportResult).where(ImportResult.id == entry.id))
+        db.commit()
+    return len(expired)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.models import Asset, Project
+from app.services.blob_store import MissingBlobs, add_assets_bulk
+from app.services.import_cache import clone_import_result, import_cache_key, store_import_result
+from app.services.pdf_importer import (
+    PageBatch,
+    check_import_budget,
+    iter_import_pages,
+    new_import_document,
+    overlay_index_specs,
+    pdf_page_count,
+    share_duplicate_assets,
+)
+
+# Progressive PDF import
+# ----------------------
+# The Project is created up front with a placeholder per page ({"pending": true}).
+# Every finished page is written into the document as soon as it completes, together
+# with a checkpoint in meta.import:
+#
+#   {"status": "running" | "done" | "failed", "pages_total": N, "pages_done": n,
+#    "pages": ["done" | "pending", ...], "error": "..."}
+#
+# so the editor can open the first pages while the rest are imported, and an
+# interrupted import resumes with the pages still pending.
+#
+# A PDF imported before with the same settings is cloned from the import cache
+# (services.import_cache) instead: the project is created already done.
+
+IMPORT_RUNNING = "running"
+IMPORT_DONE = "done"
+IMPORT_FAILED = "failed"
+
+# Meta keys owned by the import: editor saves never overwrite them.
+_IMPORT_META_KEYS = ("import", "overlay_index_asset_id")
+
+
+def _placeholder_page(i: int) -> Dict[str, Any]:
+    return {"id": f"p-{i}", "sectionType": "Imported", "layers": [], "pending": True}
+
+
+def _source_sha(db: Session, source_asset_id: Optional[str]) -> Optional[str]:
+    src = db.get(Asset, source_asset_id) if source_asset_id else None
+    return src.blob_id if src else None
+
+
+def create_import_project(
+    db: Session,
+    club_id: str,
+    pdf_path: str,
+    source_asset_id: str,
+    source_sha: Optional[str],
+    filename: Optional[str],
+    mode: str,
+    preset: str,
+) -> Project:
+    """Create the import project; `source_sha` (the source blob) keys the import cache."""
+    cached = clone_import_result(db, import_cache_key(source_sha, mode, preset), club_id) if source_sha else None
+    if cached is not None:
+        n = len(cached.get("pages") or [])
+        document = new_import_document(mode, preset, cached.get("pages") or [])
+        document["meta"] = {
+            **(cached.get("meta") or {}),
+            "source_pdf_asset_id": source_asset_id,
+            "import": {"status": IMPORT_DONE, "pages_total": n, "pages_done": n, "pages": ["done"] * n, "cached": True},
+        }
+    else:
+        n = pdf_page_count(pdf_path)
+        check_import_budget(n)
+        document = new_import_document(mode, preset, [_placeholder_page(i) for i in range(n)])
+        document["meta"] = {
+            "source_pdf_asset_id": source_asset_id,
+            "import": {"status": IMPORT_RUNNING, "pages_total": n, "pages_done": 0, "pages": ["pending"] * n},
+        }
+    proj = Project(
+        club_id=club_id,
+        name=f"Importado - {filename or 'documento.pdf'}",
+        template_id="import_pdf",
+        document_json=json.dumps(document, ensure_ascii=False),
+    )
+    db.add(proj)
+    db.commit()
+    db.refresh(proj)
+    return proj
+
+
+def import_state(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return (document.get("meta") or {}).get("import")
+
+
+def _checkpoint(
+    db: Session,
+    project_id: str,
+    pages: Dict[int, Dict[str, Any]],
+    meta: Optional[Dict[str, Any]] = None,
+    **state: Any,
+) -> Dict[str, Any]:
+    """Write finished pages and the import state into the stored document and commit.
+
+    The row is re-read under a lock so edits saved meanwhile by the editor are kept.
+    """
+    proj = db.query(Project).filter(Project.id == project_id).with_for_update().one()
+    document = json.loads(proj.document_json or "{}")
+    doc_pages = document.setdefault("pages", [])
+    doc_meta = document.setdefault("meta", {})
+    st = doc_meta.setdefault("import", {})
+    for i, page in pages.items():
+        if i < len(doc_pages):
+            doc_pages[i] = page
+        if i < len(st.get("pages", [])):
+            st["pages"][i] = "done"
+    st["pages_done"] = sum(1 for s in st.get("pages", []) if s == "done")
+    st.update(state)
+    doc_meta.update(meta or {})
+    proj.document_json = json.dumps(document, ensure_ascii=False)
+    proj.updated_at = datetime.utcnow()
+    db.commit()
+    return st
+
+
+def set_import_job(db: Session, project_id: str, job_id: str) -> Dict[str, Any]:
+    return _checkpoint(db, project_id, {}, job_id=job_id)
+
+
+def _add_batch_assets(
+    db: Session,
+    pdf_path: str,
+    preset: str,
+    batch: PageBatch,
+    first: Dict[str, str],
+    club_id: str,
+) -> Tuple[PageBatch, List[Dict[str, Any]]]:
+    """Insert the Asset rows of an imported batch: (batch as stored, specs inserted).
+
+    When a file the batch reused was garbage collected before its reference was taken
+    (MissingBlobs), its pages are imported once more, which stores the file again.
+    """
+    def insert(b: PageBatch) -> List[Dict[str, Any]]:
+        shared = dict(first)
+        kept = share_duplicate_assets(b[1], b[2], shared)
+        add_assets_bulk(db, kept, club_id=club_id)
+        first.update(shared)
+        return kept
+
+    try:
+        return batch, insert(batch)
+    except MissingBlobs:
+        db.rollback()
+    redo: PageBatch = ([], [], [], [])
+    for part in iter_import_pages(pdf_path, preset, batch[0]):
+        for acc, items in zip(redo, part):
+            acc.extend(items)
+    return redo, insert(redo)
+
+
+def run_pdf_import(
+    db: Session,
+    project_id: str,
+    pdf_path: str,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Import (or resume importing) the pending pages of an import project."""
+    proj = db.get(Project, project_id)
+    if not proj:
+        raise ValueError("Project not found")
+    document = json.loads(proj.document_json or "{}")
+    state = import_state(document) or {}
+    preset = (document.get("generator") or {}).get("preset") or "smart"
+    mode = (document.get("generator") or {}).get("mode") or "safe"
+    todo = [i for i, s in enumerate(state.get("pages", [])) if s != "done"]
+    total = int(state.get("pages_total") or len(todo))
+    club_id = proj.club_id
+    source_sha = _source_sha(db, (document.get("meta") or {}).get("source_pdf_asset_id"))
+
+    _checkpoint(db, project_id, {}, status=IMPORT_RUNNING, error=None)
+    detected: Dict[int, Any] = {}
+    first: Dict[str, str] = {}
+    # Pages and assets as imported (before any edit made meanwhile), for the import cache.
+    imported: Dict[int, Dict[str, Any]] = {}
+    imported_specs: List[Dict[str, Any]] = []
+    try:
+        for imported_batch in iter_import_pages(pdf_path, preset, todo):
+            (indexes, batch, _specs, batch_detected), kept = _add_batch_assets(
+                db, pdf_path, preset, imported_batch, first, club_id)
+            st = _checkpoint(db, project_id, dict(zip(indexes, batch)))
+            detected.update(zip(indexes, batch_detected))
+            imported.update(zip(indexes, batch))
+            imported_specs.extend(kept)
+            if progress:
+                progress(st["pages_done"], total)
+
+        # Pages imported by an earlier (interrupted) run have no entry: the detect
+        # route falls back to on-demand detection for them.
+        index_id, index_specs = overlay_index_specs([detected.get(i) for i in range(total)])
+        try:
+            add_assets_bulk(db, index_specs, club_id=club_id)
+        except MissingBlobs:
+            # Same bytes as a garbage-collected index: storing them again restores the file.
+            db.rollback()
+            index_id, index_specs = overlay_index_specs([detected.get(i) for i in range(total)])
+            add_assets_bulk(db, index_specs, club_id=club_id)
+        index_meta = {"overlay_index_asset_id": index_id} if index_id else None
+        # Only imports done in one run are cached: a resumed one lacks the pages
+        # (and their assets) of the interrupted run.
+        if source_sha and len(imported) == total:
+            store_import_result(
+                db, import_cache_key(source_sha, mode, preset), source_sha,
+                {"pages": [imported[i] for i in range(total)], "meta": index_meta or {}},
+                imported_specs + index_specs,
+            )
+        st = _checkpoint(db, project_id, {}, meta=index_meta, status=IMPORT_DONE)
+    except Exception as e:
+        db.rollback()
+        _checkpoint(db, project_id, {}, status=IMPORT_FAILED, error=str(e)[:500])
+        raise
+    return {"project_id": project_id, "pages": total, "pages_done": st["pages_done"], "mode": mode, "preset": preset}
+
+
+def keep_import_progress(stored: Dict[str, Any], incoming: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a document saved by the editor with the stored one during an import.
+
+    An editor opened mid-import holds placeholders for pages finished since, and an
+    old copy of meta.import; saving it must not roll the import back.
+    """
+    stored_meta = stored.get("meta") or {}
+    state = stored_meta.get("import")
+    if not state:
+        return incoming
+    meta = incoming.setdefault("meta", {})
+    for key in _IMPORT_META_KEYS:
+        if key in stored_meta:
+            meta[key] = stored_meta[key]
+    in_pages = incoming.get("pages") or []
+    st_pages = stored.get("pages") or []
+    for i, s in enumerate(state.get("pages", [])):
+        if s == "done" and i < len(in_pages) and i < len(st_pages) and (in_pages[i] or {}).get("pending"):
+            in_pages[i] = st_pages[i]
+    return incoming
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.services.pdf_sources import source_page
+
+# Overlay detection index
+# -----------------------
+# Detection results for the pages of an imported PDF are computed during the import
+# (from the page render the importer makes anyway for colour sampling) and stored as
+# one JSON asset, referenced from document meta.overlay_index_asset_id. Layout, one
+# entry per page (null when the import did not render it or detection failed):
+#
+#   {"v": 1, "pages": [{"t": [[x0, y0, x1, y1, text, [r, g, b], [r, g, b]], ...],
+#                       "i": [[x0, y0, x1, y1], ...]}, ...]}
+#
+# Pages without an entry (older projects, presets like "background" that sample no
+# colours) are detected on demand from the source PDF, kept open
+# (services.pdf_sources) so clicking through pages doesn't reopen it.
+
+_INDEX_VERSION = 1
+
+
+def _r(v: float, nd: int = 2) -> float:
+    return round(float(v), nd)
+
+
+def encode_overlay_index(pages: List[Optional[Dict[str, List[Dict[str, Any]]]]]) -> bytes:
+    out: List[Optional[Dict[str, Any]]] = []
+    for det in pages:
+        if det is None:
+            out.append(None)
+            continue
+        out.append({
+            "t": [
+                [*(_r(v) for v in t["rect"]), t["text"], [_r(c, 3) for c in t["color"]], [_r(c, 3) for c in t["bgColor"]]]
+                for t in det.get("text", [])
+            ],
+            "i": [[_r(v) for v in im["rect"]] for im in det.get("images", [])],
+        })
+    return json.dumps({"v": _INDEX_VERSION, "pages": out}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=32)
+def _load_index(path: str) -> Dict[str, Any]:
+    # Index files are content-addressed blobs, so a path never changes content.
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def index_page(path: str, page_index: int) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Detection results of one page from an index file, in detect_page_overlays format."""
+    idx = _load_index(path)
+    pages = idx.get("pages") or []
+    if idx.get("v") != _INDEX_VERSION or page_index < 0 or page_index >= len(pages) or pages[page_index] is None:
+        return None
+    entry = pages[page_index]
+    return {
+        "text": [
+            {"id": str(uuid.uuid4()), "text": t[4], "rect": t[:4], "color": t[5], "bgColor": t[6]}
+            for t in entry.get("t", [])
+        ],
+        "images": [{"id": str(uuid.uuid4()), "rect": im} for im in entry.get("i", [])],
+    }
+
+
+def detect_from_source(asset_id: str, pdf_path: str, page_index: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Detect one page of a stored source PDF, reusing an already open document."""
+    from app.services.pdf_importer import _render_page_pixmap, detect_page_overlays
+
+    with source_page(asset_id, pdf_path, page_index) as page:
+        return detect_page_overlays(page, _render_page_pixmap(page))
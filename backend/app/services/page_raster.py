@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import fitz
+from PIL import Image
+
+from app.core.settings import settings
+from app.services.disk_cache import DiskCache
+from app.services.image_derivatives import FORMATS, encode_image
+from app.services.pdf_sources import source_page
+
+# Page rasters of stored PDFs, rendered on demand
+# -----------------------------------------------
+# Imported pages show their source PDF page as background. Instead of a PNG made at
+# import time (blurry when zoomed, wasted on pages nobody opens), pages are rendered
+# when requested: the whole page at a zoom level, or one TILE_SIZE x TILE_SIZE tile
+# of it for deep zoom. Tile (tx, ty) at zoom z covers page points
+# [tx, tx + 1) x [ty, ty + 1) times TILE_SIZE / z.
+#
+# Results are cached by (content id, page, zoom, tile, quality, format) in a bounded
+# disk cache; content ids are blob hashes, so an entry never goes stale.
+
+MIN_ZOOM, MAX_ZOOM = 0.25, 8.0
+# Zooms are rounded up to this step so arbitrary values can't flood the cache.
+ZOOM_STEP = 0.25
+TILE_SIZE = 512
+
+_cache = DiskCache("rasters", settings.RASTER_CACHE_MAX_BYTES)
+
+
+def normalize_zoom(zoom: float) -> float:
+    z = max(MIN_ZOOM, min(float(zoom), MAX_ZOOM))
+    return min(MAX_ZOOM, -(-z // ZOOM_STEP) * ZOOM_STEP)
+
+
+def page_pixmap(page: fitz.Page, zoom: float, tile: Optional[Tuple[int, int]] = None) -> fitz.Pixmap:
+    clip = None
+    if tile is not None:
+        span = TILE_SIZE / zoom
+        tx, ty = tile
+        clip = fitz.Rect(tx * span, ty * span, (tx + 1) * span, (ty + 1) * span) & page.rect
+        if clip.is_empty:
+            raise ValueError("tile out of range")
+    elif page.rect.width * page.rect.height * zoom * zoom > settings.PDF_IMPORT_MAX_PIXELS:
+        raise ValueError("page too large at this zoom, request tiles")
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+
+
+def encode_pixmap(pix: fitz.Pixmap, fmt: str = "webp", quality: int = 80) -> bytes:
+    im = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+    return encode_image(im, fmt, quality)
+
+
+def render_page_raster(
+    page: fitz.Page,
+    zoom: float,
+    tile: Optional[Tuple[int, int]] = None,
+    fmt: str = "webp",
+    quality: int = 80,
+) -> bytes:
+    return encode_pixmap(page_pixmap(page, zoom, tile), fmt, quality)
+
+
+def get_page_raster(
+    pdf_path: str,
+    content_id: str,
+    page_index: int,
+    zoom: float = 1.0,
+    tile: Optional[Tuple[int, int]] = None,
+    fmt: str = "webp",
+    quality: int = 80,
+) -> Tuple[str, str]:
+    """Return (path, mime) of a cached page raster or tile, rendering it on first use."""
+    fmt = (fmt or "webp").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    z = normalize_zoom(zoom)
+    _pil_fmt, mime, ext = FORMATS[fmt]
+    key = raster_key(content_id, page_index, z, tile, quality)
+    hit = _cache.get(key, ext)
+    if hit:
+        return hit, mime
+    # Only the render needs the shared document; the pixmap is ours, so encoding
+    # (the slower half for WebP) runs outside the source lock.
+    with source_page(content_id, pdf_path, page_index) as page:
+        pix = page_pixmap(page, z, tile)
+    data = encode_pixmap(pix, fmt, quality)
+    return _cache.put_bytes(key, ext, data), mime
+
+
+def raster_key(content_id: str, page_index: int, zoom: float, tile: Optional[Tuple[int, int]], quality: int) -> str:
+    part = f"t{tile[0]}-{tile[1]}" if tile is not None else "full"
+    return f"{content_id}_p{page_index}_z{int(round(zoom * 100))}_{part}_q{quality}"
@@ -1,15 +1,31 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
 import io
+import json
+import multiprocessing as mp
+import os
+import re
 import uuid
-import base64
 import fitz
 from sqlalchemy.orm import Session
 
+from app.core.settings import settings
 from app.models.models import Asset
+from app.services.data_uri_cache import RASTER_MIMES, inline_image
+from app.services.disk_cache import DiskCache
+from app.services.export_images import crop_fractions, export_profile, get_export_image, target_size
 from app.services.storage import get_local_path
 
 A4_W, A4_H = 595.2756, 841.8898
+# Page backgrounds stored by imports made before on-demand rasters.
+_IMPORT_BG_RE = re.compile(r"import_bg_p(\d+)\.png")
+_IN_BATCH = 500
+# Part of every page cache key: bump it when a change to the renderer alters its output.
+EXPORT_VERSION = "export-v1"
+# Rendered pages, as single-page PDFs keyed by _page_key.
+_page_cache = DiskCache("export_pages", settings.EXPORT_PAGE_CACHE_MAX_BYTES)
 
 def _hex_to_rgb(hex_color: str):
     h = (hex_color or "").strip()
@@ -34,34 +50,142 @@ def _hex_to_rgb(hex_color: str):
     except Exception:
         return (0,0,0)
 
+def _page_asset_refs(p: Dict[str, Any]) -> set:
+    refs = set()
+    for layer in p.get("layers") or []:
+        for it in layer.get("items") or []:
+            ref = it.get("assetRef")
+            if isinstance(ref, str) and ref and not ref.startswith(("data:", "{{")):
+                refs.add(ref)
+    return refs
+
+def _asset_refs(document: Dict[str, Any]) -> set:
+    refs = set()
+    for p in document.get("pages") or []:
+        refs |= _page_asset_refs(p)
+    return refs
+
+def resolve_asset_paths(db: Session, refs: Iterable[str]) -> Dict[str, Tuple[Optional[str], str]]:
+    """(local path, filename) of each asset ref, looked up with one IN query per batch.
+
+    Refs that are not Asset ids (older documents store raw storage keys/paths) are
+    resolved as storage keys. The path is None when the file is missing.
+    """
+    refs = list(dict.fromkeys(refs))
+    rows: Dict[str, Tuple[str, str]] = {}
+    for n in range(0, len(refs), _IN_BATCH):
+        q = db.query(Asset.id, Asset.storage_path, Asset.filename).filter(Asset.id.in_(refs[n:n + _IN_BATCH]))
+        rows.update((aid, (sp, fn)) for aid, sp, fn in q)
+    out: Dict[str, Tuple[Optional[str], str]] = {}
+    for ref in refs:
+        key, filename = rows.get(ref, (ref, ""))
+        try:
+            out[ref] = (get_local_path(key), filename)
+        except Exception:
+            out[ref] = (None, filename)
+    return out
+
 def resolve_asset_path(db: Session, asset_ref: Optional[str]) -> Optional[str]:
     if not asset_ref or str(asset_ref).startswith("{{"):
         return None
-    a = db.get(Asset, str(asset_ref))
-    if a:
-        try:
-            return get_local_path(a.storage_path)
-        except Exception:
-            return None
-    # backward compat: allow raw path
+    # Asset id first; backward compat: allow raw storage key/path.
+    return resolve_asset_paths(db, [str(asset_ref)])[str(asset_ref)][0]
+
+def _source_page_index(it: Dict[str, Any], assets: Dict[str, Tuple[Optional[str], str]]) -> Optional[int]:
+    """Page of the source PDF an imported background still shows, None once replaced."""
+    ref = it.get("assetRef")
+    if not ref:
+        sp = it.get("sourcePage")
+        return int(sp) if sp is not None else None
+    if it.get("role") == "pdf_background" and ref in assets:
+        m = _IMPORT_BG_RE.fullmatch(assets[ref][1])
+        if m:
+            return int(m.group(1)) - 1
+    return None
+
+def _open_source_pdf(path: Optional[str]) -> Optional[fitz.Document]:
+    if not path:
+        return None
     try:
-        return get_local_path(str(asset_ref))
+        return fitz.open(path, filetype="pdf")
     except Exception:
         return None
 
-def export_document_to_pdf(
-    db: Session,
-    document: Dict[str, Any],
-    quality: str = "web",
-    watermark: bool = False,
-) -> bytes:
-    doc = fitz.open()
-    pages = document.get("pages") or []
-    styles = (document.get("styles") or {}).get("textStyles") or {}
-    for p in pages:
-        page = doc.new_page(width=A4_W, height=A4_H)
+def _insert_shared_image(page: fitz.Page, rect: fitz.Rect, xrefs: Dict[str, int], key: str,
+                         filename: Optional[str] = None, stream: Optional[bytes] = None) -> None:
+    """Place an image, embedding it only the first time `key` is seen in this export.
+
+    Later placements point at the same image XObject, so a pool asset used on every
+    page is read and stored once (and tobytes() has no duplicates to hunt for).
+    """
+    xref = xrefs.get(key)
+    if xref:
+        page.insert_image(rect, xref=xref, keep_proportion=False)
+        return
+    xrefs[key] = page.insert_image(rect, filename=filename, stream=stream, keep_proportion=False)
+
+def _frame_image(variants: Dict[Tuple, str], path: str, rect: fitz.Rect, crop: Any, quality: str) -> str:
+    """The file to embed for a stored image in this frame: the original or a variant
+    resampled to the quality profile's resolution (see services.export_images)."""
+    dpi, _jpeg_quality = export_profile(quality)
+    size = target_size(rect.width, rect.height, dpi)
+    box = crop_fractions(crop)
+    key = (path, size, box)
+    if key not in variants:
+        content_id = os.path.splitext(os.path.basename(path))[0]
+        variants[key] = get_export_image(path, content_id, size, box, quality)
+    return variants[key]
+
+def _watermark_pdf() -> fitz.Document:
+    """One page holding the preview watermark, shown on every page as one shared XObject."""
+    wm = fitz.open()
+    page = wm.new_page(width=A4_W, height=A4_H)
+    wm_rect = fitz.Rect(40, A4_H/2-40, A4_W-40, A4_H/2+40)
+    # PyMuPDF only allows rotate in multiples of 90 for insert_textbox.
+    # Keep watermark simple and robust (no crash on export).
+    page.insert_textbox(wm_rect, "VISTA PREVIA · UPGRADE A PRO", fontsize=34, color=(0.7,0.7,0.7), align=1)
+    # Add a subtle page tint WITHOUT relying on opacity params (not supported in some PyMuPDF builds).
+    # Try newer keyword first; fall back to a very light gray fill.
+    try:
+        page.draw_rect(fitz.Rect(0, 0, A4_W, A4_H), color=None, fill=(0, 0, 0), fill_opacity=0.03, width=0)
+    except TypeError:
+        page.draw_rect(fitz.Rect(0, 0, A4_W, A4_H), color=None, fill=(0.97, 0.97, 0.97), width=0)
+    return wm
+
+class _PageRenderer:
+    """Draws document pages for one export (resolved assets, source PDF, logo, watermark)."""
+
+    def __init__(
+        self,
+        styles: Dict[str, Any],
+        assets: Dict[str, Tuple[Optional[str], str]],
+        src_pdf: Optional[fitz.Document],
+        logo_path: Optional[str],
+        quality: str,
+        wm_pdf: Optional[fitz.Document],
+    ):
+        self.styles = styles
+        self.assets = assets
+        self.src_pdf = src_pdf
+        self.logo_path = logo_path
+        self.quality = quality
+        self.wm_pdf = wm_pdf
+        # Stored images are resampled per frame size and quality (web 96 dpi, print 300 dpi).
+        self.variants: Dict[Tuple, str] = {}
+
+    def render(self, pages: Iterable[Dict[str, Any]]) -> fitz.Document:
+        doc = fitz.open()
+        xrefs: Dict[str, int] = {}
+        for p in pages:
+            self.draw(doc.new_page(width=A4_W, height=A4_H), p, xrefs)
+        return doc
+
+    def draw(self, page: fitz.Page, p: Dict[str, Any], xrefs: Dict[str, int]) -> None:
         # render in layer order
         for layer in (p.get("layers") or []):
+            # Hidden layers (e.g. the import's detected overlays) are not part of the page.
+            if layer.get("visible") is False:
+                continue
             for it in (layer.get("items") or []):
                 t = it.get("type")
                 r = it.get("rect") or {}
@@ -71,25 +195,36 @@ def export_document_to_pdf(
                     page.draw_rect(rect, color=None, fill=fill, width=0)
                 elif t == "ImageFrame":
                     asset_ref = it.get("assetRef")
+                    pno = _source_page_index(it, self.assets) if self.src_pdf is not None else None
+                    if pno is not None:
+                        try:
+                            page.show_pdf_page(rect, self.src_pdf, pno, keep_proportion=False)
+                            continue
+                        except Exception:
+                            pass  # e.g. page out of range: draw the stored image, if any
                     # Support embedded placeholder images (data URI) for templates.
-                    if isinstance(asset_ref, str) and asset_ref.startswith("data:image/png;base64,"):
+                    if isinstance(asset_ref, str) and asset_ref.startswith("data:"):
                         try:
-                            b64 = asset_ref.split(",", 1)[1]
-                            img_bytes = base64.b64decode(b64)
-                            page.insert_image(rect, stream=img_bytes, keep_proportion=False)
+                            inline = inline_image(asset_ref)
+                            if inline is not None and inline.mime in RASTER_MIMES:
+                                _insert_shared_image(page, rect, xrefs, "data:" + inline.digest, stream=inline.data)
                         except Exception:
                             pass
                         continue
 
-                    path = resolve_asset_path(db, asset_ref)
+                    if it.get("role") == "locked_logo" and str(asset_ref or "").startswith("{{"):
+                        path = self.logo_path
+                    else:
+                        path = self.assets.get(asset_ref, (None, ""))[0] if isinstance(asset_ref, str) else None
                     if not path:
                         continue
                     try:
-                        page.insert_image(rect, filename=path, keep_proportion=False)
+                        path = _frame_image(self.variants, path, rect, it.get("crop"), self.quality)
+                        _insert_shared_image(page, rect, xrefs, path, filename=path)
                     except Exception:
                         continue
                 elif t == "TextFrame":
-                    style = styles.get(it.get("styleRef") or "Body") or styles.get("Body") or {}
+                    style = self.styles.get(it.get("styleRef") or "Body") or self.styles.get("Body") or {}
                     # Allow per-item overrides (so editor changes affect export).
                     font_size = float(it.get("fontSize") or style.get("fontSize") or 13)
                     color = _hex_to_rgb(it.get("color") or style.get("color") or "#111827")
@@ -137,22 +272,154 @@ def export_document_to_pdf(
                         continue
                     page.insert_textbox(rr, text, fontsize=font_size, color=color, fontname=fontname, align=0)
                 elif t == "LockedLogoStamp":
-                    # resolved at frontend; backend includes if club locked logo stored as assetRef in doc variables; ignored in V10.3.1 export.
-                    pass
-
-        if watermark:
-            wm_rect = fitz.Rect(40, A4_H/2-40, A4_W-40, A4_H/2+40)
-            # PyMuPDF only allows rotate in multiples of 90 for insert_textbox.
-            # Keep watermark simple and robust (no crash on export).
-            page.insert_textbox(wm_rect, "VISTA PREVIA · UPGRADE A PRO", fontsize=34, color=(0.7,0.7,0.7), align=1)
-            # Add a subtle page tint WITHOUT relying on opacity params (not supported in some PyMuPDF builds).
-            # Try newer keyword first; fall back to a very light gray fill.
-            try:
-                page.draw_rect(fitz.Rect(0, 0, A4_W, A4_H), color=None, fill=(0, 0, 0), fill_opacity=0.03, width=0)
-            except TypeError:
-                page.draw_rect(fitz.Rect(0, 0, A4_W, A4_H), color=None, fill=(0.97, 0.97, 0.97), width=0)
-
-    # Quality: for now, keep vector. (Images come as-is.)
-    out = doc.tobytes(deflate=True, garbage=4, clean=True)
+                    # Always the club's locked logo (as in the editor); assetRef is a fallback.
+                    ref = it.get("assetRef")
+                    path = self.logo_path or (self.assets.get(ref, (None, ""))[0] if isinstance(ref, str) else None)
+                    if not path:
+                        continue
+                    try:
+                        path = _frame_image(self.variants, path, rect, None, self.quality)
+                        _insert_shared_image(page, rect, xrefs, path, filename=path)
+                    except Exception:
+                        continue
+
+
+        if self.wm_pdf is not None:
+            page.show_pdf_page(page.rect, self.wm_pdf, 0)
+
+def _page_key(p: Dict[str, Any], context: str, assets: Dict[str, Tuple[Optional[str], str]]) -> str:
+    """Hash of everything a rendered page depends on: its JSON, the files behind its
+    asset refs (content-addressed paths) and the export context."""
+    h = hashlib.sha256(context.encode("utf-8"))
+    h.update(json.dumps(p, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8", "surrogatepass"))
+    for ref in sorted(_page_asset_refs(p)):
+        h.update(f"\0{ref}={assets.get(ref, (None, ''))[0]}".encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+def _render_pages(spec: Dict[str, Any], pages: List[Dict[str, Any]], keys: List[str]) -> fitz.Document:
+    """Render pages into one document, saving a single-page copy of each to the page cache.
+
+    `spec` carries everything resolved up front (styles, asset paths, source PDF, logo,
+    quality, watermark), so no DB access is needed.
+    """
+    src_pdf = _open_source_pdf(spec["source_path"])
+    wm_pdf = _watermark_pdf() if spec["watermark"] else None
+    renderer = _PageRenderer(spec["styles"], spec["assets"], src_pdf, spec["logo_path"], spec["quality"], wm_pdf)
+    try:
+        # Rendered together: each image is embedded once in the batch.
+        batch = renderer.render(pages)
+        for k, key in enumerate(keys):
+            with fitz.open() as one:
+                one.insert_pdf(batch, from_page=k, to_page=k)
+                _page_cache.put_bytes(key, ".pdf", one.tobytes(deflate=True, garbage=3))
+    finally:
+        for extra_pdf in (src_pdf, wm_pdf):
+            if extra_pdf is not None:
+                extra_pdf.close()
+    return batch
+
+def _render_page_range(spec: Dict[str, Any], pages: List[Dict[str, Any]], keys: List[str]) -> bytes:
+    """Process-pool worker: _render_pages, returned as PDF bytes."""
+    with _render_pages(spec, pages, keys) as batch:
+        return batch.tobytes(deflate=True, garbage=3)
+
+def _export_workers(page_count: int) -> int:
+    cpus = os.cpu_count() or 1
+    # More workers than CPUs only adds process start-up and contention.
+    workers = min(settings.EXPORT_WORKERS or cpus, cpus)
+    if page_count < max(2, settings.EXPORT_PARALLEL_MIN_PAGES):
+        return 1
+    return max(1, min(workers, page_count))
+
+def _render_pages_parallel(
+    spec: Dict[str, Any],
+    pages: List[Dict[str, Any]],
+    keys: List[str],
+    todo: List[int],
+    workers: int,
+) -> Iterator[Tuple[List[int], fitz.Document]]:
+    # Contiguous chunks, two per worker: each chunk embeds its images once, and the
+    # extra chunk per worker evens out image-heavy vs. text-only pages.
+    chunk = max(1, -(-len(todo) // (workers * 2)))
+    ranges = [todo[a:a + chunk] for a in range(0, len(todo), chunk)]
+    # spawn: never fork a process that holds DB connections and server threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(_render_page_range, spec, [pages[i] for i in r], [keys[i] for i in r]): r
+            for r in ranges
+        }
+        for fut in as_completed(futures):
+            yield futures[fut], fitz.open("pdf", fut.result())
+
+def export_document_to_pdf(
+    db: Session,
+    document: Dict[str, Any],
+    quality: str = "web",
+    watermark: bool = False,
+    locked_logo_asset_id: Optional[str] = None,
+) -> bytes:
+    """Render a document to PDF bytes.
+
+    `locked_logo_asset_id` (the club's locked logo) fills LockedLogoStamp items and
+    {{club.lockedLogo}} placeholders. Pages unchanged since an earlier export come
+    from the page cache; only the others are rendered, in a process pool when there
+    are many of them (EXPORT_WORKERS, EXPORT_PARALLEL_MIN_PAGES).
+    """
+    pages = document.get("pages") or []
+    styles = (document.get("styles") or {}).get("textStyles") or {}
+    # Imported pages: unedited backgrounds are the original page, placed as a vector
+    # XObject (sharp at any zoom, original size) instead of a raster.
+    source_id = (document.get("meta") or {}).get("source_pdf_asset_id")
+    # Every asset of the document is resolved up front: no per-item lookups.
+    extra = {str(x) for x in (source_id, locked_logo_asset_id) if x}
+    assets = resolve_asset_paths(db, _asset_refs(document) | extra)
+    source_path = assets[str(source_id)][0] if source_id else None
+    logo_path = assets[str(locked_logo_asset_id)][0] if locked_logo_asset_id else None
+    context = json.dumps([EXPORT_VERSION, quality, bool(watermark), source_path, logo_path, styles],
+                         sort_keys=True, ensure_ascii=False)
+    keys = [_page_key(p, context, assets) for p in pages]
+
+    paths = [_page_cache.get(key, ".pdf") for key in keys]
+    missing = [i for i, path in enumerate(paths) if not path]
+    spec = {"styles": styles, "assets": assets, "source_path": source_path, "logo_path": logo_path,
+            "quality": quality, "watermark": bool(watermark)}
+    workers = _export_workers(len(missing))
+    if workers > 1:
+        batches = list(_render_pages_parallel(spec, pages, keys, missing, workers))
+    elif missing:
+        batches = [(missing, _render_pages(spec, [pages[i] for i in missing], [keys[i] for i in missing]))]
+    else:
+        batches = []
+
+    if len(batches) == 1 and len(missing) == len(pages):
+        # Nothing cached: the rendered batch is the export, images already embedded once.
+        doc = batches.pop()[1]
+        garbage = 3
+    else:
+        # Cached pages (and parallel chunks) are separate PDFs, each with its own copy of
+        # the images, fonts and source-page resources: garbage=4 merges them.
+        if len(batches) == 1:
+            # Saved like the cached pages, so shared objects match byte for byte.
+            indexes, batch = batches[0]
+            batches = [(indexes, fitz.open("pdf", batch.tobytes(deflate=True, garbage=3)))]
+            batch.close()
+        fresh = {i: (batch, k) for indexes, batch in batches for k, i in enumerate(indexes)}
+        doc = fitz.open()
+        for i, path in enumerate(paths):
+            if i in fresh:
+                src, k = fresh[i]
+                doc.insert_pdf(src, from_page=k, to_page=k)
+            else:
+                try:
+                    one = fitz.open(path, filetype="pdf")
+                except (FileNotFoundError, fitz.FileNotFoundError, fitz.FileDataError):
+                    # Evicted by another process since get(): a cache miss after all.
+                    one = _render_pages(spec, [pages[i]], [keys[i]])
+                with one:
+                    doc.insert_pdf(one)
+        garbage = 4
+    out = doc.tobytes(deflate=True, garbage=garbage, clean=True)
     doc.close()
+    for _indexes, batch in batches:
+        batch.close()
     return out
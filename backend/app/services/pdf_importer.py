@@ -1,14 +1,42 @@
 from __future__ import annotations
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Tuple
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+import hashlib
+import math
 import uuid
 import os
 import fitz
+import numpy as np
 from sqlalchemy.orm import Session
 
-from app.models.models import Asset
-from app.services.storage import save_local_file
+from app.core.settings import settings
+from app.services.blob_store import MissingBlobs, add_assets_bulk
+from app.services.overlay_index import encode_overlay_index
+from app.services.storage import store_blob
 
 A4_W, A4_H = 595.2756, 841.8898
+# Bump when the importer's output changes: cached import results are keyed by it.
+IMPORT_VERSION = "import-v7"
+
+ProgressFn = Callable[[int, int], None]
+
+class ImportTooLarge(ValueError):
+    pass
+
+
+def check_import_budget(page_count: int) -> None:
+    """Reject documents over PDF_IMPORT_MAX_PAGES before any page is rendered."""
+    if settings.PDF_IMPORT_MAX_PAGES and page_count > settings.PDF_IMPORT_MAX_PAGES:
+        raise ImportTooLarge(f"PDF has {page_count} pages (max {settings.PDF_IMPORT_MAX_PAGES})")
+
+
+def _release_page_resources() -> None:
+    # MuPDF keeps decoded fonts and images in a process-wide store (up to 256 MB) that
+    # would otherwise fill up over a long import; halving it after each page keeps the
+    # resources of recent pages (fonts are usually shared) and costs next to nothing.
+    fitz.TOOLS.store_shrink(50)
 
 def _int_to_hex_rgb(c: int) -> str:
     # PyMuPDF span color is usually 0xRRGGBB.
@@ -21,235 +49,527 @@ def _int_to_hex_rgb(c: int) -> str:
         return "#111827"
 
 
-def _sample_solid_bg_hex(pix: fitz.Pixmap, bbox: fitz.Rect, page_w: float, page_h: float) -> str | None:
-    """Best-effort detection of a solid background color behind a text bbox.
+def _pix_array(pix: fitz.Pixmap) -> np.ndarray:
+    """Zero-copy (height, width, n) uint8 view on a pixmap's samples.
+
+    Built on samples_mv: pix.samples would copy the whole buffer. The view is only
+    valid while `pix` is alive.
+    """
+    flat = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    return flat.reshape(pix.height, pix.stride)[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+
+# Sampling grid inside a bbox: 5x5 points at 1/6 .. 5/6 (avoids borders).
+_GRID = np.arange(1, 6) / 6
 
-    We sample a small grid of pixels from a low-res pixmap. If the color variance
-    is low, we assume it's a solid background (e.g., a colored label) and return
-    its mean color as hex. Otherwise returns None.
+
+def _sample_solid_bg_hex(pix: fitz.Pixmap | None, bboxes: List[Tuple[float, float, float, float]], page_w: float, page_h: float) -> List[str | None]:
+    """Best-effort detection of solid background colors behind text bboxes.
+
+    For each bbox we sample a small grid of pixels from a page render. If the color
+    variance is low, we assume it's a solid background (e.g., a colored label) and
+    return its mean color as hex, otherwise None. All bboxes of a page are sampled
+    in one vectorized pass.
     """
+    out: List[str | None] = [None] * len(bboxes)
     try:
-        if pix is None or pix.width <= 0 or pix.height <= 0:
-            return None
-        # Ignore tiny boxes
-        if (bbox.x1 - bbox.x0) * (bbox.y1 - bbox.y0) < 400:  # in PDF points^2
-            return None
+        if pix is None or pix.width <= 0 or pix.height <= 0 or not bboxes:
+            return out
+        arr = _pix_array(pix)
+        W, H = pix.width, pix.height
+        b = np.asarray(bboxes, dtype=np.float64)
         # Map PDF coords -> pix coords
-        x0 = max(0, min(pix.width - 1, int(bbox.x0 / page_w * pix.width)))
-        x1 = max(0, min(pix.width, int(bbox.x1 / page_w * pix.width)))
-        y0 = max(0, min(pix.height - 1, int(bbox.y0 / page_h * pix.height)))
-        y1 = max(0, min(pix.height, int(bbox.y1 / page_h * pix.height)))
-        if x1 - x0 < 6 or y1 - y0 < 6:
-            return None
-
-        # Sample a 5x5 grid inside the bbox (avoid borders)
-        samples: List[Tuple[int, int, int]] = []
-        for gy in range(5):
-            for gx in range(5):
-                xx = x0 + int((gx + 1) / 6 * (x1 - x0))
-                yy = y0 + int((gy + 1) / 6 * (y1 - y0))
-                # pix.samples is bytes in RGB/RGBA order
-                idx = (yy * pix.width + xx) * pix.n
-                r = pix.samples[idx + 0]
-                g = pix.samples[idx + 1]
-                b = pix.samples[idx + 2]
-                samples.append((r, g, b))
-
-        mr = sum(s[0] for s in samples) / len(samples)
-        mg = sum(s[1] for s in samples) / len(samples)
-        mb = sum(s[2] for s in samples) / len(samples)
+        x0 = np.clip((b[:, 0] / page_w * W).astype(np.int64), 0, W - 1)
+        x1 = np.clip((b[:, 2] / page_w * W).astype(np.int64), 0, W)
+        y0 = np.clip((b[:, 1] / page_h * H).astype(np.int64), 0, H - 1)
+        y1 = np.clip((b[:, 3] / page_h * H).astype(np.int64), 0, H)
+        # Ignore tiny boxes (area in PDF points^2)
+        area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        idx = np.nonzero((area >= 400) & (x1 - x0 >= 6) & (y1 - y0 >= 6))[0]
+        if not len(idx):
+            return out
+
+        xs = x0[idx, None] + (_GRID[None, :] * (x1 - x0)[idx, None]).astype(np.int64)  # (m, 5)
+        ys = y0[idx, None] + (_GRID[None, :] * (y1 - y0)[idx, None]).astype(np.int64)
+        px = arr[ys[:, :, None], xs[:, None, :], :3].reshape(len(idx), 25, 3).astype(np.float64)
+        mean = px.mean(axis=1)
         # Variance as mean absolute deviation
-        dev = sum(abs(s[0] - mr) + abs(s[1] - mg) + abs(s[2] - mb) for s in samples) / len(samples)
-        if dev > 18:  # heuristic threshold
-            return None
-        return f"#{int(mr):02x}{int(mg):02x}{int(mb):02x}"
+        dev = np.abs(px - mean[:, None, :]).sum(axis=2).mean(axis=1)
+        for k, j in enumerate(idx):
+            if dev[k] > 18:  # heuristic threshold
+                continue
+            mr, mg, mb = (int(v) for v in mean[k])
+            out[j] = f"#{mr:02x}{mg:02x}{mb:02x}"
+        return out
     except Exception:
-        return None
+        return out
+
+def import_scale(page: fitz.Page) -> float:
+    """Render scale of a page: PDF_IMPORT_SCALE, reduced to fit PDF_IMPORT_MAX_PIXELS.
 
-def _render_page_image(doc: fitz.Document, page_index: int, scale: float | None = None) -> bytes:
+    Posters and oversized spreads would otherwise need renders of hundreds of MB.
+    """
+    # Lower scale makes imports MUCH faster on small servers (Render free tiers).
+    scale = float(os.getenv("PDF_IMPORT_SCALE", "1.25"))
+    area = float(page.rect.width) * float(page.rect.height)
+    budget = settings.PDF_IMPORT_MAX_PIXELS
+    if budget > 0 and area > 0 and area * scale * scale > budget:
+        scale = math.sqrt(budget / area)
+    return scale
+
+# Colours (text backgrounds, detected overlays) are read from a coarse render: the
+# samplers average a sparse grid inside each box, which any scale serves.
+SAMPLE_SCALE = 0.5
+
+def _render_page_pixmap(page: fitz.Page, scale: float | None = None) -> fitz.Pixmap:
+    """The one rasterization of a page per import, at SAMPLE_SCALE (or less, see import_scale).
+
+    Background sampling and overlay detection share it.
+    """
     if scale is None:
-        # Lower scale makes imports MUCH faster on small servers (Render free tiers).
-        scale = float(os.getenv("PDF_IMPORT_SCALE", "1.25"))
-    page = doc.load_page(page_index)
+        scale = min(SAMPLE_SCALE, import_scale(page))
     mat = fitz.Matrix(scale, scale)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
-    return pix.tobytes("png")
+    return page.get_pixmap(matrix=mat, alpha=False)
 
 def _map_rect(r: fitz.Rect, page_w: float, page_h: float):
     sx = A4_W / page_w
     sy = A4_H / page_h
     return {"x": float(r.x0 * sx), "y": float(r.y0 * sy), "w": float((r.x1 - r.x0) * sx), "h": float((r.y1 - r.y0) * sy)}
 
-def _mk_asset(db: Session, club_id: str, png_bytes: bytes, base_name: str) -> str:
-    # Use the same id on disk and in the DB so every pipeline (editor, exporter, importer) can resolve assets reliably.
-    asset_id, _path = save_local_file(png_bytes, f"{base_name}.png")
-    db.add(Asset(id=asset_id, club_id=club_id, filename=f"{base_name}.png", mime="image/png", storage_path=asset_id, is_catalog=False))
-    return asset_id
+class AssetSink:
+    """Stores extracted images as blobs and records the Asset rows to create.
 
-def import_pdf_to_document(db: Session, club_id: str, pdf_bytes: bytes, mode: str="safe", preset: str="smart") -> Tuple[Dict[str, Any], List[str]]:
-    """Import PDF into native-ish document.
+    Nothing touches the database here, so page workers can run in other processes;
+    the parent inserts all rows in one go (blob_store.add_assets_bulk).
+    """
 
-    - Always creates a background raster of each page (safe mode).
-    - Extracts text blocks into editable TextFrames.
-    - Extracts embedded images into ImageFrames when possible.
+    def __init__(self):
+        self.specs: List[Dict[str, Any]] = []
+        # Embedded images already stored during this import, by xref and by stream digest.
+        self.images: Dict[Any, str | None] = {}
+
+    def add(self, png_bytes: bytes, base_name: str) -> str:
+        # Identical images (e.g. the same logo on every page) share one stored blob.
+        return self.add_file(png_bytes, f"{base_name}.png", "image/png")
+
+    def add_file(self, content: bytes, filename: str, mime: str) -> str:
+        sha, _path, _created = store_blob(content, filename, content_type=mime)
+        asset_id = uuid.uuid4().hex
+        self.specs.append({"id": asset_id, "sha": sha, "size": len(content), "filename": filename, "mime": mime})
+        return asset_id
+
+def _image_asset(doc: fitz.Document, xref: int, page_index: int, sink: AssetSink, pixels: int = 0) -> str | None:
+    """Asset id of an embedded image, extracting and encoding each distinct image once.
+
+    Logos, sponsor banners and page furniture are usually one xref drawn on every
+    page, and sometimes the same stream embedded under several xrefs; both map to
+    the asset stored the first time.
+
+    Images over PDF_IMPORT_MAX_PIXELS (`pixels` = width * height) are never decoded:
+    JPEGs are stored as their raw stream, anything else stays in the background raster.
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages=[]
-    created_asset_ids: List[str] = []
-
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        page_w, page_h = float(page.rect.width), float(page.rect.height)
-
-        pix_low: fitz.Pixmap | None = None
-        if preset in ("smart", "text", "pro"):
-            try:
-                # Low-res raster used only to guess solid backgrounds behind text blocks.
-                pix_low = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5), alpha=False)
-            except Exception:
-                pix_low = None
-
-        # Background raster
-        bg_png = _render_page_image(doc, i)
-        bg_asset_id = _mk_asset(db, club_id, bg_png, f"import_bg_p{i+1}")
-        created_asset_ids.append(bg_asset_id)
-
-        bg_item = {
-            "id": f"bg-{i}",
-            "type":"ImageFrame",
-            "rect":{"x":0,"y":0,"w":A4_W,"h":A4_H},
-            "assetRef": bg_asset_id,
-            "fitMode":"cover",
-            "crop":{"x":0,"y":0,"w":1,"h":1},
-            "locked": True,
-            "role":"pdf_background"
-        }
-
-        overlay_items: List[Dict[str,Any]] = []
-
-        # Text extraction
+    if xref in sink.images:
+        return sink.images[xref]
+    try:
+        # Object dictionary (colour space, decode, mask...) plus the raw stream.
+        h = hashlib.sha1(doc.xref_object(xref, compressed=True).encode())
+        h.update(doc.xref_stream_raw(xref) or b"")
+        digest = h.hexdigest()
+    except Exception:
+        digest = None
+    if digest and ("sha1", digest) in sink.images:
+        asset_id = sink.images[("sha1", digest)]
+        sink.images[xref] = asset_id
+        return asset_id
+
+    im_bytes: bytes | None = None
+    if settings.PDF_IMPORT_MAX_PIXELS and pixels > settings.PDF_IMPORT_MAX_PIXELS:
         try:
-            td = page.get_text("dict")
-            for b in td.get("blocks", []):
-                if b.get("type") != 0:
-                    continue
-                # block bbox
-                x0,y0,x1,y1 = b.get("bbox", [0,0,0,0])
-                rect = _map_rect(fitz.Rect(x0,y0,x1,y1), page_w, page_h)
-                # build rich text runs preserving basic styles from spans
-                runs: List[Dict[str,Any]] = []
-                for li, ln in enumerate(b.get("lines", [])):
-                    for sp in ln.get("spans", []):
-                        t = sp.get("text","")
-                        if not t:
-                            continue
-                        marks: Dict[str,Any] = {}
-                        # Size + color + font
-                        try:
-                            marks["size"] = float(sp.get("size", 13))
-                        except Exception:
-                            pass
-                        col = sp.get("color")
-                        if isinstance(col, int):
-                            marks["color"] = _int_to_hex_rgb(col)
-                        fn = (sp.get("font") or "").strip()
-                        if fn:
-                            marks["font"] = fn
-                        # Flags may encode bold/italic
-                        flags = sp.get("flags")
-                        if isinstance(flags, int):
-                            if flags & 16:
-                                marks["bold"] = True
-                            if flags & 2:
-                                marks["italic"] = True
-                        runs.append({"text": t, "marks": marks})
-                    if li < len(b.get("lines", [])) - 1:
-                        runs.append({"text": "\n", "marks": {}})
-                # Compact: if all runs empty or whitespace, skip
-                plain = "".join([r.get("text","") for r in runs]).strip()
-                if not plain:
-                    continue
+            if doc.xref_get_key(xref, "Filter") == ("name", "/DCTDecode"):
+                im_bytes = doc.xref_stream_raw(xref)
+        except Exception:
+            im_bytes = None
+        asset_id = sink.add_file(im_bytes, f"import_img_{page_index+1}_{xref}.jpg", "image/jpeg") if im_bytes else None
+        sink.images[xref] = asset_id
+        return asset_id
+
+    # Convert to PNG via pixmap for consistency
+    try:
+        pix = fitz.Pixmap(doc, xref)
+        if pix.n >= 5:  # CMYK etc
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        im_bytes = pix.tobytes("png")
+    except Exception:
+        try:
+            im_bytes = (doc.extract_image(xref) or {}).get("image")
+        except Exception:
+            im_bytes = None
+    asset_id = sink.add(im_bytes, f"import_img_{page_index+1}_{xref}") if im_bytes else None
+    sink.images[xref] = asset_id
+    if digest:
+        sink.images[("sha1", digest)] = asset_id
+    return asset_id
+
+def share_duplicate_assets(pages: List[Dict[str, Any]], specs: List[Dict[str, Any]],
+                           first: Dict[str, str] | None = None) -> List[Dict[str, Any]]:
+    """Collapse Asset specs with identical content into the first one seen.
+
+    Parallel workers each keep their own image cache, so an image on pages handled
+    by different workers arrives as several specs; point every frame at one asset.
+    `first` (content hash -> asset id) carries over between batches of one import.
+    Returns the specs that still need a row.
+    """
+    first = {} if first is None else first
+    remap: Dict[str, str] = {}
+    kept: List[Dict[str, Any]] = []
+    for spec in specs:
+        canonical = first.setdefault(spec["sha"], spec["id"])
+        if canonical == spec["id"]:
+            kept.append(spec)
+        else:
+            remap[spec["id"]] = canonical
+    if remap:
+        for page in pages:
+            for layer in page.get("layers", []):
+                for it in layer.get("items", []):
+                    ref = it.get("assetRef")
+                    if ref in remap:
+                        it["assetRef"] = remap[ref]
+    return kept
+
+# Text layout analysis
+# --------------------
+# PyMuPDF splits text into many small blocks (often one per line or two). Blocks that
+# continue each other in a column (widths overlapping, similar size, same background,
+# small vertical gap) are chained into one TextFrame, found through a grid index over
+# block bboxes instead of comparing every pair.
+_GRID_CELL = 64.0  # points
+_MIN_X_OVERLAP = 0.6  # of the narrower block
+_MAX_GAP = 1.5  # times the font size of the upper block
+_PARAGRAPH_GAP = 0.8  # gaps over this (times the font size) keep an empty line
+
+class _BlockGrid:
+    def __init__(self, boxes: List[Tuple[float, float, float, float]], cell: float = _GRID_CELL):
+        self.cell = cell
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for k, box in enumerate(boxes):
+            for key in self._keys(*box):
+                self.cells[key].append(k)
+
+    def _keys(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[int, int]]:
+        for cx in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for cy in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                yield cx, cy
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> set:
+        found: set = set()
+        for key in self._keys(x0, y0, x1, y1):
+            found.update(self.cells.get(key, ()))
+        return found
+
+def _coalesce_text_blocks(boxes: List[Tuple[float, float, float, float]], sizes: List[float],
+                          bgs: List[str | None]) -> List[List[int]]:
+    """Group text blocks into column chains; returns block indexes, top to bottom."""
+    grid = _BlockGrid(boxes)
+    below: Dict[int, int] = {}
+    has_above: set = set()
+    for k in sorted(range(len(boxes)), key=lambda k: (boxes[k][1], boxes[k][0])):
+        x0, y0, x1, y1 = boxes[k]
+        max_gap = _MAX_GAP * sizes[k]
+        best, best_gap = None, None
+        for j in grid.query(x0, y1 - 2, x1, y1 + max_gap):
+            if j == k or j in has_above:
+                continue
+            jx0, jy0, jx1, _jy1 = boxes[j]
+            # Strictly lower tops keep chains acyclic: two thin overlapping blocks must
+            # not pick each other (neither would start a chain, and both would be lost).
+            if jy0 <= y0:
+                continue
+            gap = jy0 - y1
+            if gap < -2 or gap > max_gap or bgs[j] != bgs[k]:
+                continue
+            if not (0.8 <= sizes[j] / max(sizes[k], 0.1) <= 1.25):
+                continue
+            if min(x1, jx1) - max(x0, jx0) < _MIN_X_OVERLAP * min(x1 - x0, jx1 - jx0):
+                continue
+            if best_gap is None or gap < best_gap:
+                best, best_gap = j, gap
+        if best is not None:
+            below[k] = best
+            has_above.add(best)
+    groups: List[List[int]] = []
+    for k in range(len(boxes)):
+        if k in has_above:
+            continue
+        chain = [k]
+        while chain[-1] in below:
+            chain.append(below[chain[-1]])
+        groups.append(chain)
+    groups.sort(key=lambda g: (boxes[g[0]][1], boxes[g[0]][0]))
+    return groups
+
+def _fold_runs(runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge consecutive runs with identical marks."""
+    out: List[Dict[str, Any]] = []
+    for r in runs:
+        if out and out[-1]["marks"] == r["marks"]:
+            out[-1]["text"] += r["text"]
+        else:
+            out.append({"text": r["text"], "marks": r["marks"]})
+    return out
+
+def _open_pdf(pdf: bytes | str) -> fitz.Document:
+    # A path lets PyMuPDF read pages from disk instead of holding the whole file in memory.
+    if isinstance(pdf, str):
+        return fitz.open(pdf, filetype="pdf")
+    return fitz.open(stream=pdf, filetype="pdf")
+
+def _import_page(doc: fitz.Document, i: int, preset: str, sink: AssetSink) -> Dict[str, Any]:
+    page = doc.load_page(i)
+    page_w, page_h = float(page.rect.width), float(page.rect.height)
+
+    # The background is the source page itself: rasters are rendered on demand from
+    # the stored PDF (services.page_raster), so nothing is encoded or stored here.
+    # The render is only read for colours (text backgrounds, overlay detection), so
+    # presets that sample no colours skip it; their pages are detected on demand.
+    pix: fitz.Pixmap | None = _render_page_pixmap(page) if preset in ("smart", "text", "pro") else None
+
+    bg_item = {
+        "id": f"bg-{i}",
+        "type":"ImageFrame",
+        "rect":{"x":0,"y":0,"w":A4_W,"h":A4_H},
+        # Page of the PDF in meta.source_pdf_asset_id; an assetRef set later (new
+        # background picked in the editor) takes precedence.
+        "sourcePage": i,
+        "fitMode":"cover",
+        "crop":{"x":0,"y":0,"w":1,"h":1},
+        "locked": True,
+        "role":"pdf_background"
+    }
 
-                # Try to detect a solid background color behind this text block
-                bg_hex: str | None = None
-                if pix_low is not None:
+    overlay_items: List[Dict[str,Any]] = []
+
+    try:
+        td = page.get_text("dict")
+    except Exception:
+        td = {}
+
+    # Text extraction
+    try:
+        boxes: List[Tuple[float, float, float, float]] = []
+        block_runs: List[List[Dict[str, Any]]] = []
+        sizes: List[float] = []
+        for b in td.get("blocks", []):
+            if b.get("type") != 0:
+                continue
+            # block bbox
+            x0,y0,x1,y1 = b.get("bbox", [0,0,0,0])
+            # build rich text runs preserving basic styles from spans
+            runs: List[Dict[str,Any]] = []
+            for li, ln in enumerate(b.get("lines", [])):
+                for sp in ln.get("spans", []):
+                    t = sp.get("text","")
+                    if not t:
+                        continue
+                    marks: Dict[str,Any] = {}
+                    # Size + color + font
                     try:
-                        bg_hex = _sample_solid_bg_hex(pix_low, fitz.Rect(x0, y0, x1, y1), page_w, page_h)
+                        marks["size"] = float(sp.get("size", 13))
                     except Exception:
-                        bg_hex = None
-                if bg_hex:
-                    for r in runs:
-                        # Only set default bg if the run doesn't already have one.
-                        if isinstance(r, dict):
-                            marks = r.get("marks") or {}
-                            if "bg" not in marks:
-                                marks["bg"] = bg_hex
-                                r["marks"] = marks
+                        pass
+                    col = sp.get("color")
+                    if isinstance(col, int):
+                        marks["color"] = _int_to_hex_rgb(col)
+                    fn = (sp.get("font") or "").strip()
+                    if fn:
+                        marks["font"] = fn
+                    # Flags may encode bold/italic
+                    flags = sp.get("flags")
+                    if isinstance(flags, int):
+                        if flags & 16:
+                            marks["bold"] = True
+                        if flags & 2:
+                            marks["italic"] = True
+                    runs.append({"text": t, "marks": marks})
+                if li < len(b.get("lines", [])) - 1:
+                    # Same marks as the line it ends, so a paragraph folds into one run.
+                    runs.append({"text": "\n", "marks": dict(runs[-1]["marks"]) if runs else {}})
+            # Compact: if all runs empty or whitespace, skip
+            plain = "".join([r.get("text","") for r in runs]).strip()
+            if not plain:
+                continue
+
+            boxes.append((x0, y0, x1, y1))
+            block_runs.append(runs)
+            # Body size of the block: the size of its longest span.
+            main = max((r for r in runs if r["text"] != "\n"), key=lambda r: len(r["text"]))
+            sizes.append(float(main["marks"].get("size") or 13))
+
+        # Try to detect a solid background color behind each text block
+        bg_hexes = _sample_solid_bg_hex(pix, boxes, page_w, page_h)
+        for group in _coalesce_text_blocks(boxes, sizes, bg_hexes):
+            bg_hex = bg_hexes[group[0]]
+            runs = []
+            for n, k in enumerate(group):
+                if n:
+                    prev = group[n - 1]
+                    sep = "\n\n" if boxes[k][1] - boxes[prev][3] > _PARAGRAPH_GAP * sizes[prev] else "\n"
+                    runs.append({"text": sep, "marks": dict(runs[-1]["marks"])})
+                runs.extend(block_runs[k])
+            if bg_hex:
+                for r in runs:
+                    # Only set default bg if the run doesn't already have one.
+                    if isinstance(r, dict):
+                        marks = r.get("marks") or {}
+                        if "bg" not in marks:
+                            marks["bg"] = bg_hex
+                            r["marks"] = marks
+            gx0 = min(boxes[k][0] for k in group)
+            gy0 = min(boxes[k][1] for k in group)
+            gx1 = max(boxes[k][2] for k in group)
+            gy1 = max(boxes[k][3] for k in group)
+
+            overlay_items.append({
+                "id": f"tx-{i}-{len(overlay_items)}",
+                "type":"TextFrame",
+                "rect": _map_rect(fitz.Rect(gx0, gy0, gx1, gy1), page_w, page_h),
+                "text": _fold_runs(runs),
+                "styleRef":"Body",
+                "padding": 6,
+                **({"bg": bg_hex} if bg_hex else {}),
+            })
+    except Exception:
+        pass
 
+    # Image extraction (embedded)
+    try:
+        imgs = page.get_images(full=True)
+        seen=set()
+        for img in imgs:
+            xref = img[0]
+            if xref in seen:
+                continue
+            seen.add(xref)
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+            asset_id = _image_asset(doc, xref, i, sink, pixels=img[2] * img[3])
+            if not asset_id:
+                continue
+            for r in rects[:4]:
+                rr = _map_rect(r, page_w, page_h)
+                if rr["w"] < 10 or rr["h"] < 10:
+                    continue
                 overlay_items.append({
-                    "id": f"tx-{i}-{len(overlay_items)}",
-                    "type":"TextFrame",
-                    "rect": rect,
-                    "text": runs,
-                    "styleRef":"Body",
-                    "padding": 6,
-                    **({"bg": bg_hex} if bg_hex else {}),
+                    "id": f"im-{i}-{xref}-{len(overlay_items)}",
+                    "type":"ImageFrame",
+                    "rect": rr,
+                    "assetRef": asset_id,
+                    "fitMode":"cover",
+                    "crop":{"x":0,"y":0,"w":1,"h":1},
+                    "role":"imported_image",
                 })
-        except Exception:
-            pass
-
-        # Image extraction (embedded)
+    except Exception:
+        pass
+
+    # Layers: background locked, overlay editable
+    # IMPORTANT UX: detection overlays are OFF by default.
+    # The editor can toggle detected text / images on demand.
+    layers=[
+        {"id":"bg","name":"PDF Fondo","visible":True,"locked":True,"items":[bg_item]},
+        {"id":"overlay","name":"Detectado","visible":False,"locked":False,"items":overlay_items},
+    ]
+    # Overlay detection for the editor's "detect" action, from the same render and
+    # text dict; import_pdf_to_document moves it into the overlay index. Without a
+    # render the page is left out of the index and detected when first asked for.
+    detected = None
+    if pix is not None:
         try:
-            imgs = page.get_images(full=True)
-            seen=set()
-            for img in imgs:
-                xref = img[0]
-                if xref in seen:
-                    continue
-                seen.add(xref)
-                rects = page.get_image_rects(xref)
-                if not rects:
-                    continue
-                raw = doc.extract_image(xref)
-                im_bytes = raw.get("image")
-                if not im_bytes:
-                    continue
-                # Convert to PNG via pixmap for consistency
-                try:
-                    pix = fitz.Pixmap(doc, xref)
-                    if pix.n >= 5:  # CMYK etc
-                        pix = fitz.Pixmap(fitz.csRGB, pix)
-                    im_bytes = pix.tobytes("png")
-                except Exception:
-                    pass
-                asset_id = _mk_asset(db, club_id, im_bytes, f"import_img_{i+1}_{xref}")
-                created_asset_ids.append(asset_id)
-                for r in rects[:4]:
-                    rr = _map_rect(r, page_w, page_h)
-                    if rr["w"] < 10 or rr["h"] < 10:
-                        continue
-                    overlay_items.append({
-                        "id": f"im-{i}-{xref}-{len(overlay_items)}",
-                        "type":"ImageFrame",
-                        "rect": rr,
-                        "assetRef": asset_id,
-                        "fitMode":"cover",
-                        "crop":{"x":0,"y":0,"w":1,"h":1},
-                        "role":"imported_image",
-                    })
+            detected = detect_page_overlays(page, pix, td.get("blocks"))
         except Exception:
-            pass
-
-        # Layers: background locked, overlay editable
-        # IMPORTANT UX: detection overlays are OFF by default.
-        # The editor can toggle detected text / images on demand.
-        layers=[
-            {"id":"bg","name":"PDF Fondo","visible":True,"locked":True,"items":[bg_item]},
-            {"id":"overlay","name":"Detectado","visible":False,"locked":False,"items":overlay_items},
-        ]
-        pages.append({"id": f"p-{i}", "sectionType":"Imported", "layers": layers})
-
-    out_doc = {
+            detected = None
+    return {"id": f"p-{i}", "sectionType":"Imported", "layers": layers, "_detected": detected}
+
+PageBatch = Tuple[List[int], List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any] | None]]
+
+def _import_page_range(pdf_path: str, indexes: List[int], preset: str) -> PageBatch:
+    """Process-pool worker: import the given pages from its own handle on the PDF."""
+    doc = _open_pdf(pdf_path)
+    sink = AssetSink()
+    try:
+        pages = []
+        for i in indexes:
+            pages.append(_import_page(doc, i, preset, sink))
+            _release_page_resources()
+    finally:
+        doc.close()
+    return indexes, pages, sink.specs, [p.pop("_detected", None) for p in pages]
+
+def _import_workers(page_count: int) -> int:
+    workers = settings.PDF_IMPORT_WORKERS or (os.cpu_count() or 1)
+    if page_count < max(2, settings.PDF_IMPORT_PARALLEL_MIN_PAGES):
+        return 1
+    return max(1, min(workers, page_count))
+
+def _import_pages_parallel(pdf_path: str, todo: List[int], preset: str, workers: int) -> Iterator[PageBatch]:
+    # A few ranges per worker balance uneven pages (image-heavy spreads vs. text pages)
+    # while keeping each worker on contiguous pages of its own document handle.
+    chunk = max(1, -(-len(todo) // (workers * 3)))
+    ranges = [todo[a:a + chunk] for a in range(0, len(todo), chunk)]
+    # spawn: never fork a process that holds DB connections and server threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = [pool.submit(_import_page_range, pdf_path, r, preset) for r in ranges]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+def pdf_page_count(pdf: bytes | str) -> int:
+    doc = _open_pdf(pdf)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def iter_import_pages(pdf: bytes | str, preset: str = "smart", pages: Iterable[int] | None = None) -> Iterator[PageBatch]:
+    """Import pages of a PDF, yielding them as they complete.
+
+    Yields (page_indexes, page_dicts, asset_specs, detected) batches: one page at a time
+    in-process, one page range at a time with the process pool (PDF_IMPORT_WORKERS,
+    only for documents given as a path). Batches may arrive out of page order.
+    Images are stored as blobs; Asset rows are left to the caller
+    (blob_store.add_assets_bulk). `pages` restricts the import to some pages (resume).
+    """
+    doc = _open_pdf(pdf)
+    todo = list(range(doc.page_count)) if pages is None else sorted(set(pages))
+    workers = _import_workers(len(todo)) if isinstance(pdf, str) else 1
+    if workers > 1:
+        doc.close()
+        yield from _import_pages_parallel(pdf, todo, preset, workers)
+        return
+    sink = AssetSink()
+    try:
+        for i in todo:
+            n = len(sink.specs)
+            page = _import_page(doc, i, preset, sink)
+            _release_page_resources()
+            yield [i], [page], sink.specs[n:], [page.pop("_detected", None)]
+    finally:
+        doc.close()
+
+def overlay_index_specs(detected: List[Dict[str, Any] | None]) -> Tuple[str | None, List[Dict[str, Any]]]:
+    """Store detection results of every page as one compact index asset.
+
+    With it the editor's detect action never has to reopen and re-render the source
+    PDF (see services.overlay_index). Returns (asset_id, specs), or (None, []) when
+    no page has detection results.
+    """
+    if not any(d is not None for d in detected):
+        return None, []
+    sink = AssetSink()
+    asset_id = sink.add_file(encode_overlay_index(detected), "overlay_index.json", "application/json")
+    return asset_id, sink.specs
+
+def new_import_document(mode: str, preset: str, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
         "id": str(uuid.uuid4()),
         "format":"A4",
         "spreads": True,
@@ -266,55 +586,88 @@ def import_pdf_to_document(db: Session, club_id: str, pdf_bytes: bytes, mode: st
         "pages": pages,
         "componentsLibrary": [],
         "variables": {},
-        "generator": {"version":"import-v2", "mode": mode, "preset": preset},
+        "generator": {"version": IMPORT_VERSION, "mode": mode, "preset": preset},
     }
+
+def import_pdf_to_document(db: Session, club_id: str, pdf: bytes | str, mode: str="safe", preset: str="smart",
+                           progress: ProgressFn | None = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Import PDF (bytes or a file path) into native-ish document.
+
+    - Each page gets a background item for its source page (sourcePage), rendered
+      on demand once the PDF is stored as meta.source_pdf_asset_id.
+    - Extracts text blocks into editable TextFrames.
+    - Extracts embedded images into ImageFrames when possible.
+
+    All pages are imported before returning (see iter_import_pages for the
+    incremental form used by import jobs); Asset rows are inserted in bulk.
+    `progress(done, total)` is called as pages complete.
+    """
+    page_count = pdf_page_count(pdf)
+    check_import_budget(page_count)
+    for attempt in (0, 1):
+        pages: List[Dict[str, Any]] = [{} for _ in range(page_count)]
+        detected: List[Dict[str, Any] | None] = [None] * page_count
+        specs: List[Dict[str, Any]] = []
+        first: Dict[str, str] = {}
+        done = 0
+        for indexes, batch, batch_specs, batch_detected in iter_import_pages(pdf, preset):
+            specs.extend(share_duplicate_assets(batch, batch_specs, first))
+            for i, page, det in zip(indexes, batch, batch_detected):
+                pages[i] = page
+                detected[i] = det
+            done += len(indexes)
+            if progress:
+                progress(done, page_count)
+
+        overlay_index_id, index_specs = overlay_index_specs(detected)
+        try:
+            created_asset_ids = add_assets_bulk(db, specs + index_specs, club_id=club_id)
+            break
+        except MissingBlobs:
+            # A reused file was garbage collected meanwhile: importing again stores it.
+            db.rollback()
+            if attempt:
+                raise
+
+    out_doc = new_import_document(mode, preset, pages)
+    if overlay_index_id:
+        out_doc["meta"] = {"overlay_index_asset_id": overlay_index_id}
     db.commit()
     return out_doc, created_asset_ids
 
 
-def detect_pdf_page_overlays(pdf_bytes: bytes, page_index: int) -> Dict[str, List[Dict[str, Any]]]:
-    """Detect text blocks and image placeholders for a single page (0-based)."""
-    d = fitz.open(stream=pdf_bytes, filetype="pdf")
-    if page_index < 0 or page_index >= d.page_count:
-        raise ValueError("page_index out of range")
-
-    page = d.load_page(page_index)
+def detect_page_overlays(page: fitz.Page, pix: fitz.Pixmap, blocks: List[Dict[str, Any]] | None = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Detect text blocks and image placeholders on a page, sampling colours from `pix`.
 
-    # Render page once for simple background sampling
-    zoom = 2.0
-    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
-    img_bytes = pix.samples
+    `pix` is a render of the whole page at any scale (e.g. the import render), so
+    detection never rasterizes the page on its own. `blocks` may pass in the blocks
+    of an already extracted get_text("dict").
+    """
+    arr = _pix_array(pix)
     width, height = pix.width, pix.height
+    zoom_x = width / float(page.rect.width)
+    zoom_y = height / float(page.rect.height)
 
     def _avg_rgb(rect: fitz.Rect) -> Tuple[float, float, float]:
         # rect is in page points; convert to rendered pixels
-        x0 = max(0, int(rect.x0 * zoom))
-        y0 = max(0, int(rect.y0 * zoom))
-        x1 = min(width, int(rect.x1 * zoom))
-        y1 = min(height, int(rect.y1 * zoom))
+        x0 = max(0, int(rect.x0 * zoom_x))
+        y0 = max(0, int(rect.y0 * zoom_y))
+        x1 = min(width, int(rect.x1 * zoom_x))
+        y1 = min(height, int(rect.y1 * zoom_y))
         if x1 <= x0 or y1 <= y0:
             return (1.0, 1.0, 1.0)
-        # sample a sparse grid for speed
+        # sample a sparse grid (a strided view, no copy)
         step_x = max(1, (x1 - x0) // 20)
         step_y = max(1, (y1 - y0) // 20)
-        r = g = b = n = 0
-        for yy in range(y0, y1, step_y):
-            row_off = yy * width * 3
-            for xx in range(x0, x1, step_x):
-                off = row_off + xx * 3
-                r += img_bytes[off]
-                g += img_bytes[off + 1]
-                b += img_bytes[off + 2]
-                n += 1
-        if n == 0:
-            return (1.0, 1.0, 1.0)
-        return (r / (255.0 * n), g / (255.0 * n), b / (255.0 * n))
+        r, g, b = arr[y0:y1:step_y, x0:x1:step_x, :3].mean(axis=(0, 1)) / 255.0
+        return (float(r), float(g), float(b))
 
     out_text: List[Dict[str, Any]] = []
     out_images: List[Dict[str, Any]] = []
 
     # Text blocks
-    blocks = page.get_text("dict").get("blocks", [])
+    if blocks is None:
+        blocks = page.get_text("dict").get("blocks", [])
     for b in blocks:
         if b.get("type") != 0:
             continue
@@ -360,5 +713,17 @@ def detect_pdf_page_overlays(pdf_bytes: bytes, page_index: int) -> Dict[str, Lis
                 }
             )
 
-    d.close()
     return {"text": out_text, "images": out_images}
+
+
+def detect_pdf_page_overlays(pdf: bytes | str, page_index: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Detect text blocks and image placeholders for a single page (0-based)."""
+    d = _open_pdf(pdf)
+    try:
+        if page_index < 0 or page_index >= d.page_count:
+            raise ValueError("page_index out of range")
+        page = d.load_page(page_index)
+        # Same render scale as the import, so both agree on sampled colours.
+        return detect_page_overlays(page, _render_page_pixmap(page))
+    finally:
+        d.close()
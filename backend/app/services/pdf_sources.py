@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+import fitz
+
+from app.core.settings import settings
+
+# Source PDFs of imported projects, kept open per process (up to PDF_DOC_CACHE_SIZE)
+# so on-demand detection and page rasters don't reopen the file for every request.
+# fitz documents are not thread-safe and sync routes run in a threadpool, so each
+# open document has its own lock; _docs_lock only guards the cache itself, so a
+# long render of one document never holds up requests for another.
+_docs: "OrderedDict[str, Tuple[fitz.Document, threading.Lock]]" = OrderedDict()
+_docs_lock = threading.Lock()
+
+
+def _open_source(key: str, pdf_path: str) -> Tuple[fitz.Document, threading.Lock]:
+    with _docs_lock:
+        entry = _docs.get(key)
+        if entry is not None:
+            _docs.move_to_end(key)
+            return entry
+    # Opened outside the cache lock; a concurrent open of the same key keeps the first.
+    doc = fitz.open(pdf_path, filetype="pdf")
+    evicted = []
+    with _docs_lock:
+        entry = _docs.get(key)
+        if entry is None:
+            entry = _docs[key] = (doc, threading.Lock())
+            while len(_docs) > max(1, settings.PDF_DOC_CACHE_SIZE):
+                evicted.append(_docs.popitem(last=False)[1])
+        else:
+            evicted.append((doc, threading.Lock()))
+    # Evicted documents are closed once whoever is using them is done.
+    for old, old_lock in evicted:
+        with old_lock:
+            old.close()
+    return entry
+
+
+@contextmanager
+def source_page(key: str, pdf_path: str, page_index: int) -> Iterator[fitz.Page]:
+    """A page of a stored PDF, opened once per `key` (asset or blob id).
+
+    The page may only be used inside the `with` block, which holds the lock of its
+    document: do only the fitz work in it (e.g. get_pixmap) and post-process results
+    (encoding, sampling) after leaving it.
+    """
+    while True:
+        doc, lock = _open_source(key, pdf_path)
+        with lock:
+            if doc.is_closed:  # evicted between lookup and lock: open it again
+                continue
+            if page_index < 0 or page_index >= doc.page_count:
+                raise ValueError("page_index out of range")
+            yield doc.load_page(page_index)
+            return
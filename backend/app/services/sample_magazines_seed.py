@@ -29,7 +29,7 @@ import fitz  # PyMuPDF
 from sqlalchemy.orm import Session
 
 from app.models.models import Asset, Template
-from app.services.storage import save_local_file
+from app.services.blob_store import save_asset
 
 
 A4_W, A4_H = 595.2756, 841.8898
@@ -68,17 +68,8 @@ def _asset_exists(db: Session, filename: str) -> bool:
 
 
 def _add_asset(db: Session, content: bytes, filename: str) -> str:
-    asset_id, _path = save_local_file(content, filename)
-    a = Asset(
-        id=asset_id,
-        club_id=None,
-        filename=filename,
-        mime="image/png",
-        storage_path=asset_id,
-        is_catalog=True,
-    )
-    db.add(a)
-    return asset_id
+    a = save_asset(db, content, filename, "image/png", club_id=None, is_catalog=True)
+    return a.id
 
 
 def _render_pdf_pages_to_assets(
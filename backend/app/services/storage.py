@@ -1,54 +1,390 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import re
+import threading
 import uuid
-from typing import Tuple
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
 
 from app.core.settings import settings
+from app.services.disk_cache import DiskCache
+from app.services.storage_backends import LocalBackend, S3Backend, StorageBackend
+
+# Files are stored in a fan-out layout: <root>/ab/cd/<asset_id><ext>, where "ab" and
+# "cd" are the first characters of the id. The directory of an id is derived from the
+# id itself, so resolving it never has to scan the whole storage dir.
+#
+# Where the bytes actually live depends on STORAGE_MODE ("local" or "s3", see
+# storage_backends). STORAGE_LOCAL_DIR is the store itself in local mode; otherwise it
+# only holds a size-bounded read-through cache (.cache/objects).
+_LAYOUT_MARKER = ".layout_sharded"
+_UPLOADED_MARKER = ".uploaded_to_backend"
+_KEY_RE = re.compile(r"^[0-9a-f]{16,64}$")
+
+class _PathCache:
+    """Process-level id -> path LRU (PATH_CACHE_SIZE entries, re-validated on use).
+
+    The one place resolved paths are remembered: exports, routes and workers all
+    resolve through get_local_path.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            path = self._entries.get(key)
+            if path is not None:
+                self._entries.move_to_end(key)
+            return path
+
+    def __setitem__(self, key: str, path: str) -> None:
+        with self._lock:
+            self._entries[key] = path
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_path_cache = _PathCache(settings.PATH_CACHE_SIZE)
+
+CHUNK_SIZE = 1024 * 1024
+
+_backend: Optional[StorageBackend] = None
+
+
+class EmptyUpload(ValueError):
+    pass
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        mode = (settings.STORAGE_MODE or "local").strip().lower()
+        if mode == "s3":
+            _backend = S3Backend(
+                bucket=settings.S3_BUCKET,
+                cache=DiskCache("objects", settings.S3_CACHE_MAX_BYTES),
+                endpoint=settings.S3_ENDPOINT,
+                access_key=settings.S3_ACCESS_KEY,
+                secret_key=settings.S3_SECRET_KEY,
+                region=settings.S3_REGION,
+                public_endpoint=settings.S3_PUBLIC_ENDPOINT,
+            )
+        elif mode == "local":
+            _backend = LocalBackend(settings.STORAGE_LOCAL_DIR)
+        else:
+            raise RuntimeError(f"Unsupported STORAGE_MODE: {settings.STORAGE_MODE}")
+    return _backend
+
 
 def ensure_dirs():
     os.makedirs(settings.STORAGE_LOCAL_DIR, exist_ok=True)
 
-def save_local_file(content: bytes, filename: str) -> Tuple[str, str]:
+
+def shard_dir(key: str) -> str:
+    return os.path.join(settings.STORAGE_LOCAL_DIR, key[:2], key[2:4])
+
+
+def _is_key(s: str) -> bool:
+    return bool(_KEY_RE.match(s))
+
+
+def _layout_migrated() -> bool:
+    return os.path.exists(os.path.join(settings.STORAGE_LOCAL_DIR, _LAYOUT_MARKER))
+
+
+def _object_key(stem: str, ext: str) -> str:
+    return f"{stem[:2]}/{stem[2:4]}/{stem}{ext}"
+
+
+def _incoming_path() -> str:
+    incoming = os.path.join(settings.STORAGE_LOCAL_DIR, ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    return os.path.join(incoming, f"{uuid.uuid4().hex}.part")
+
+
+def _commit(tmp: str, key: str, content_type: Optional[str] = None) -> str:
+    """Hand a finished temp file to the backend and return its local path."""
+    backend = get_backend()
+    backend.put_file(key, tmp, content_type=content_type)
+    return backend.fetch(key)
+
+
+def save_local_file(content: bytes, filename: str, content_type: Optional[str] = None) -> Tuple[str, str]:
     ensure_dirs()
     ext = os.path.splitext(filename)[1].lower() or ".bin"
     asset_id = uuid.uuid4().hex
-    path = os.path.join(settings.STORAGE_LOCAL_DIR, f"{asset_id}{ext}")
-    with open(path, "wb") as f:
+    tmp = _incoming_path()
+    with open(tmp, "wb") as f:
         f.write(content)
+    path = _commit(tmp, _object_key(asset_id, ext), content_type)
+    _path_cache[asset_id] = path
     return asset_id, path
 
+
+# acquire(sha, size): takes the caller's reference to the blob (blob_store.acquire_blob)
+# before the store is checked for it. Once taken, the garbage collector can no longer
+# delete the file (see asset_gc), so an existing one is safe to reuse.
+AcquireFn = Callable[[str, int], None]
+
+
+def store_blob(
+    content: bytes,
+    filename: str,
+    content_type: Optional[str] = None,
+    acquire: Optional[AcquireFn] = None,
+) -> Tuple[str, str, bool]:
+    """Store content under its SHA-256 key.
+
+    Identical bytes map to the same file, so storing them again costs no write.
+    Returns (sha256, path, created).
+    """
+    ensure_dirs()
+    sha = hashlib.sha256(content).hexdigest()
+    if acquire is not None:
+        acquire(sha, len(content))
+    backend = get_backend()
+    existing = backend.find(sha)
+    if existing:
+        return sha, backend.fetch(existing), False
+    ext = os.path.splitext(filename)[1].lower() or ".bin"
+    tmp = _incoming_path()
+    with open(tmp, "wb") as f:
+        f.write(content)
+    path = _commit(tmp, _object_key(sha, ext), content_type)
+    _path_cache[sha] = path
+    return sha, path, True
+
+
+def store_blob_stream(
+    fileobj: BinaryIO,
+    filename: str,
+    max_bytes: Optional[int] = None,
+    content_type: Optional[str] = None,
+    acquire: Optional[AcquireFn] = None,
+) -> Tuple[str, str, int, bool]:
+    """Stream a file object to storage in chunks, hashing it on the fly.
+
+    Memory use is bounded by CHUNK_SIZE whatever the upload size. Raises
+    UploadTooLarge as soon as max_bytes is exceeded, EmptyUpload for empty input.
+    Returns (sha256, path, size, created).
+    """
+    ensure_dirs()
+    tmp = _incoming_path()
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                h.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise EmptyUpload("Empty upload")
+        sha = h.hexdigest()
+        if acquire is not None:
+            acquire(sha, size)
+        backend = get_backend()
+        existing = backend.find(sha)
+        if existing:
+            os.remove(tmp)
+            return sha, backend.fetch(existing), size, False
+        ext = os.path.splitext(filename)[1].lower() or ".bin"
+        path = _commit(tmp, _object_key(sha, ext), content_type)
+        _path_cache[sha] = path
+        return sha, path, size, True
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def object_key(asset_id_or_path: str) -> str:
+    """Resolve a stored id (or legacy path) to its backend key, without downloading it."""
+    s = (asset_id_or_path or "").strip()
+    key = os.path.splitext(os.path.basename(s))[0]
+    if _is_key(key):
+        found = get_backend().find(key)
+        if found:
+            return found
+    # Legacy files outside the sharded layout only exist on the local disk.
+    path = get_local_path(s)
+    rel = os.path.relpath(path, settings.STORAGE_LOCAL_DIR)
+    if rel.startswith(".."):
+        raise FileNotFoundError(s)
+    return rel.replace(os.sep, "/")
+
+
+def read_range(key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    return get_backend().read_range(key, start, end)
+
+
+def object_size(key: str) -> int:
+    return get_backend().size(key)
+
+
+def object_stat(key: str) -> Tuple[int, float]:
+    return get_backend().stat(key)
+
+
+def presigned_url(key: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+    """Direct download URL from the backend (None for local storage or when disabled)."""
+    if not settings.STORAGE_PRESIGNED_DOWNLOADS:
+        return None
+    return get_backend().presigned_url(key, filename=filename, content_type=content_type,
+                                       expires=settings.S3_PRESIGN_EXPIRE_SEC)
+
+
+def iter_objects() -> Iterator[Tuple[str, int, float]]:
+    return get_backend().iter_keys()
+
+
+def delete_object(key: str) -> None:
+    get_backend().delete(key)
+    _path_cache.pop(os.path.splitext(key.rsplit("/", 1)[-1])[0], None)
+
+
 def get_local_path(asset_id_or_path: str) -> str:
     """Return an absolute path for a stored asset.
 
     Historical versions stored either:
     - asset_id (uuid hex) in DB, or
-    - an absolute path in DB.
+    - an absolute path in DB (flat layout, before sharding).
 
-    This function supports both for backward compatibility.
+    This function supports both for backward compatibility. Ids resolve through
+    their shard directory, so the cost does not depend on the number of stored files.
+    With a remote backend the object is fetched into the local cache first.
     """
-    ensure_dirs()
-
     s = (asset_id_or_path or "").strip()
     if not s:
         raise FileNotFoundError("<empty>")
 
+    cached = _path_cache.get(s)
+    if cached and os.path.exists(cached):
+        return cached
+
+    ensure_dirs()
+
     # If it's already an existing file path, return it.
     if os.path.isabs(s) and os.path.exists(s):
         return s
 
     # If it's a file inside the storage dir (relative), use it.
     candidate = os.path.join(settings.STORAGE_LOCAL_DIR, s)
-    if os.path.exists(candidate):
+    if not os.path.isabs(s) and os.path.isfile(candidate):
         return candidate
 
-    # Otherwise treat it as asset_id prefix.
-    for fn in os.listdir(settings.STORAGE_LOCAL_DIR):
-        if fn.startswith(s):
-            return os.path.join(settings.STORAGE_LOCAL_DIR, fn)
+    # Otherwise treat it as an asset id. Legacy paths ("/…/storage/<id>.png") are
+    # reduced to their id, since migrated files moved into the sharded layout.
+    key = os.path.splitext(os.path.basename(s))[0]
+    if _is_key(key):
+        backend = get_backend()
+        found = backend.find(key)
+        if found:
+            path = backend.fetch(found)
+            _path_cache[s] = path
+            return path
+
+    # Storage not migrated yet: keep the old flat prefix lookup as a fallback.
+    if not _layout_migrated():
+        for fn in os.listdir(settings.STORAGE_LOCAL_DIR):
+            if fn.startswith(key) and os.path.isfile(os.path.join(settings.STORAGE_LOCAL_DIR, fn)):
+                return os.path.join(settings.STORAGE_LOCAL_DIR, fn)
     raise FileNotFoundError(s)
 
 
+def migrate_flat_layout() -> int:
+    """Move files stored flat in STORAGE_LOCAL_DIR into the sharded layout.
+
+    Idempotent and cheap once done: a marker file records that the migration ran.
+    Only files named after an asset id are moved (credentials files and other
+    operator files in the storage dir are left alone). Returns the number of moved files.
+    """
+    ensure_dirs()
+    if _layout_migrated():
+        return 0
+    moved = 0
+    root = settings.STORAGE_LOCAL_DIR
+    with os.scandir(root) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            key = os.path.splitext(entry.name)[0]
+            if not _is_key(key):
+                continue
+            folder = shard_dir(key)
+            os.makedirs(folder, exist_ok=True)
+            try:
+                os.replace(entry.path, os.path.join(folder, entry.name))
+                moved += 1
+            except FileNotFoundError:
+                # Moved concurrently by another process.
+                continue
+    with open(os.path.join(root, _LAYOUT_MARKER), "w", encoding="utf-8") as f:
+        f.write(f"moved={moved}\n")
+    return moved
+
+
+def upload_local_objects() -> int:
+    """Upload files stored on the local disk (sharded layout) to a remote backend.
+
+    For stores switched to STORAGE_MODE=s3: files written before the switch (or by
+    migrate_flat_layout) only exist on this node. Each one missing from the bucket is
+    uploaded; the local file is then removed, as the bucket becomes the copy of record
+    (reads go through the object cache). No-op in local mode; a marker file records
+    a completed run. Returns the number of uploaded files.
+
+    A one-off step for the switch, run by scripts/migrate_storage.py, never at app
+    startup: it walks the whole local store and every worker would race on it.
+    """
+    ensure_dirs()
+    backend = get_backend()
+    marker = os.path.join(settings.STORAGE_LOCAL_DIR, _UPLOADED_MARKER)
+    if backend.is_local or os.path.exists(marker):
+        return 0
+    local = LocalBackend(settings.STORAGE_LOCAL_DIR)
+    uploaded = 0
+    for key, _size, _mtime in list(local.iter_keys()):
+        src = local.path(key)
+        if backend.exists(key):
+            local.delete(key)
+            continue
+        tmp = _incoming_path()
+        try:
+            os.replace(src, tmp)
+        except FileNotFoundError:
+            # Uploaded concurrently by another process.
+            continue
+        backend.put_file(key, tmp)
+        uploaded += 1
+    _path_cache.clear()
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(f"uploaded={uploaded}\n")
+    return uploaded
+
+
 # Backwards-compatible alias used by other modules.
 # Some routes historically imported `get_path_for_asset`.
 def get_path_for_asset(asset_id_or_path: str) -> str:
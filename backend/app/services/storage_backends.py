@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import os
+import uuid
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.services.disk_cache import DiskCache
+
+# Storage backends
+# ----------------
+# Keys are relative, "/"-separated paths in the sharded layout ("ab/cd/<id><ext>").
+# `storage.py` picks the backend from settings.STORAGE_MODE; the rest of the app only
+# talks to storage.py. Backends that are not a local filesystem keep a read-through
+# copy of fetched objects in a size-bounded DiskCache (STORAGE_LOCAL_DIR/.cache/objects),
+# because PyMuPDF and Pillow need files.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def shard_prefix(stem: str) -> str:
+    return f"{stem[:2]}/{stem[2:4]}"
+
+
+def _read_file_range(f: BinaryIO, start: int, end: Optional[int]) -> Iterator[bytes]:
+    with f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            n = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = f.read(n)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class StorageBackend:
+    """Interface implemented by every storage driver."""
+
+    name = "base"
+    is_local = False
+
+    def find(self, stem: str) -> Optional[str]:
+        """Return the key stored for an id (file name without extension), if any."""
+        raise NotImplementedError
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        """Store a local file under key. The source file is consumed (moved or deleted)."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Tuple[int, float]:
+        """(size, mtime) of an object; raises FileNotFoundError if missing."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        return self.stat(key)[0]
+
+    def read_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the bytes of key from start to end (inclusive), in chunks."""
+        raise NotImplementedError
+
+    def fetch(self, key: str) -> str:
+        """Return a local filesystem path holding the object's bytes."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, float]]:
+        """Yield (key, size, mtime) for every object in the sharded layout."""
+        raise NotImplementedError
+
+    def presigned_url(
+        self,
+        key: str,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        expires: int = 3600,
+    ) -> Optional[str]:
+        """Direct download URL for the object, or None if the backend can't provide one."""
+        return None
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def find(self, stem: str) -> Optional[str]:
+        prefix = shard_prefix(stem)
+        try:
+            names = os.listdir(self.path(prefix))
+        except FileNotFoundError:
+            return None
+        for fn in names:
+            if fn.endswith(".part"):
+                continue
+            if os.path.splitext(fn)[0] == stem:
+                return f"{prefix}/{fn}"
+        return None
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        dst = self.path(key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(src_path, dst)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def stat(self, key: str) -> Tuple[int, float]:
+        st = os.stat(self.path(key))
+        return st.st_size, st.st_mtime
+
+    def read_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        return _read_file_range(open(self.path(key), "rb"), start, end)
+
+    def fetch(self, key: str) -> str:
+        path = self.path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        return path
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, float]]:
+        for top in sorted(os.listdir(self.root)):
+            # Only shard dirs ("ab/cd/..."); skips .incoming, caches and operator files.
+            if len(top) != 2 or not os.path.isdir(os.path.join(self.root, top)):
+                continue
+            for dirpath, _dirs, files in os.walk(os.path.join(self.root, top)):
+                rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+                for fn in files:
+                    if fn.endswith(".part"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(dirpath, fn))
+                    except FileNotFoundError:
+                        continue
+                    yield f"{rel}/{fn}", st.st_size, st.st_mtime
+
+
+class S3Backend(StorageBackend):
+    """S3-compatible driver (AWS S3, MinIO, ...).
+
+    Uploads go through boto3's managed transfer, which switches to multipart
+    uploads above `multipart_threshold`. Downloads can be served with presigned
+    URLs so asset bytes don't pass through the API process.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        *,
+        bucket: str,
+        cache: DiskCache,
+        endpoint: str = "",
+        access_key: str = "",
+        secret_key: str = "",
+        region: str = "us-east-1",
+        public_endpoint: str = "",
+        multipart_threshold: int = 8 * 1024 * 1024,
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError as e:  # pragma: no cover - depends on deployment
+            raise RuntimeError("STORAGE_MODE=s3 requires boto3") from e
+
+        self._ClientError = ClientError
+        self.bucket = bucket
+        # Local copies of uploaded/fetched objects, evicted least recently used first.
+        self.cache = cache
+        cfg = Config(signature_version="s3v4", s3={"addressing_style": "path"})
+
+        def _client(url: str):
+            return boto3.client(
+                "s3",
+                endpoint_url=url or None,
+                aws_access_key_id=access_key or None,
+                aws_secret_access_key=secret_key or None,
+                region_name=region,
+                config=cfg,
+            )
+
+        self.client = _client(endpoint)
+        # Presigned URLs embed the host they were signed for, so sign them against the
+        # endpoint browsers can reach (e.g. localhost:9000 for a MinIO container).
+        self.presign_client = _client(public_endpoint) if public_endpoint else self.client
+        self.transfer = TransferConfig(multipart_threshold=multipart_threshold, multipart_chunksize=multipart_threshold)
+        self._ensure_bucket()
+
+    def _ensure_bucket(self) -> None:
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except self._ClientError:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def _cached(self, key: str) -> Optional[str]:
+        """Path of the local copy of key, if any (touched, as a cache hit)."""
+        stem, ext = os.path.splitext(key.rsplit("/", 1)[-1])
+        return self.cache.get(stem, ext)
+
+    def find(self, stem: str) -> Optional[str]:
+        folder = os.path.dirname(self.cache.path_for(stem, ""))
+        try:
+            names = os.listdir(folder)
+        except FileNotFoundError:
+            names = []
+        for fn in names:
+            if not fn.endswith(".part") and os.path.splitext(fn)[0] == stem:
+                return f"{shard_prefix(stem)}/{fn}"
+        resp = self.client.list_objects_v2(Bucket=self.bucket, Prefix=f"{shard_prefix(stem)}/{stem}", MaxKeys=10)
+        for obj in resp.get("Contents") or []:
+            key = obj["Key"]
+            if os.path.splitext(key.rsplit("/", 1)[-1])[0] == stem:
+                return key
+        return None
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_file(src_path, self.bucket, key, ExtraArgs=extra, Config=self.transfer)
+        # Keep the bytes we just uploaded as the local cached copy.
+        stem, ext = os.path.splitext(key.rsplit("/", 1)[-1])
+        self.cache.put_file(stem, ext, src_path)
+
+    def exists(self, key: str) -> bool:
+        if self._cached(key):
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self._ClientError:
+            return False
+
+    def stat(self, key: str) -> Tuple[int, float]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except self._ClientError:
+            raise FileNotFoundError(key)
+        return int(head["ContentLength"]), head["LastModified"].timestamp()
+
+    def read_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        local = self._cached(key)
+        if local:
+            try:
+                yield from _read_file_range(open(local, "rb"), start, end)
+                return
+            except FileNotFoundError:  # evicted since the lookup: read from the bucket
+                pass
+        rng = f"bytes={start}-{'' if end is None else end}"
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key, Range=rng)["Body"]
+        except self._ClientError:
+            raise FileNotFoundError(key)
+        for chunk in body.iter_chunks(CHUNK_SIZE):
+            yield chunk
+
+    def fetch(self, key: str) -> str:
+        local = self._cached(key)
+        if local:
+            return local
+        stem, ext = os.path.splitext(key.rsplit("/", 1)[-1])
+        path = self.cache.path_for(stem, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            self.client.download_file(self.bucket, key, tmp, Config=self.transfer)
+        except self._ClientError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise FileNotFoundError(key)
+        return self.cache.put_file(stem, ext, tmp)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        stem, ext = os.path.splitext(key.rsplit("/", 1)[-1])
+        try:
+            os.remove(self.cache.path_for(stem, ext))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for obj in page.get("Contents") or []:
+                yield obj["Key"], int(obj["Size"]), obj["LastModified"].timestamp()
+
+    def presigned_url(
+        self,
+        key: str,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        expires: int = 3600,
+    ) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.presign_client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
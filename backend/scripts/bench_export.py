@@ -0,0 +1,97 @@
+from __future__ import annotations
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+# Measures PDF export wall-clock time against the number of render workers, on a
+# synthetic magazine (photo frames, text, logo) with a cold page cache, e.g.:
+#   python -m scripts.bench_export --pages 120 --workers 1,4,8,16
+# Runs against a throwaway storage dir and in-memory database. Set before the app is
+# imported; spawned render workers re-run this module and inherit the parent's dir.
+if "BENCH_EXPORT_DIR" not in os.environ:
+    os.environ["BENCH_EXPORT_DIR"] = tempfile.mkdtemp(prefix="bench_export_")
+os.environ["STORAGE_LOCAL_DIR"] = os.environ["BENCH_EXPORT_DIR"]
+os.environ["DATABASE_URL"] = "sqlite://"
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.db import Base
+from app.core.settings import settings
+from app.models.models import Asset
+from app.services.pdf_exporter import export_document_to_pdf
+from app.services.storage import store_blob_stream
+
+
+def _photo(seed: int, w: int, h: int) -> str:
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:h, 0:w]
+    arr = np.stack([xs / w * 255, ys / h * 255, (xs + ys) % 255], -1) + rng.normal(0, 24, (h, w, 3))
+    buf = io.BytesIO()
+    Image.fromarray(arr.clip(0, 255).astype("uint8")).save(buf, "JPEG", quality=90)
+    buf.seek(0)
+    sha, _path, _size, _created = store_blob_stream(buf, f"photo{seed}.jpg", content_type="image/jpeg")
+    return sha
+
+
+def _document(pages: int, photos: list[str]) -> dict:
+    out = []
+    for i in range(pages):
+        items = [
+            {"type": "ImageFrame", "rect": {"x": 0, "y": 0, "w": 595, "h": 420}, "assetRef": photos[i % len(photos)]},
+            {"type": "ImageFrame", "rect": {"x": 40, "y": 600, "w": 250, "h": 180},
+             "assetRef": photos[(i + 1) % len(photos)], "crop": {"x": 0.2, "y": 0.2, "w": 0.6, "h": 0.6}},
+            {"type": "Shape", "rect": {"x": 0, "y": 420, "w": 595, "h": 30}, "fill": "#1d4ed8"},
+            {"type": "TextFrame", "rect": {"x": 40, "y": 460, "w": 515, "h": 130},
+             "text": [{"text": f"Página {i + 1}. " + "Crónica del partido y declaraciones. " * 12}]},
+            {"type": "LockedLogoStamp", "rect": {"x": 480, "y": 700, "w": 80, "h": 80}, "assetRef": photos[0]},
+        ]
+        out.append({"id": f"p-{i}", "layers": [{"items": items}]})
+    return {"pages": out}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark PDF export time per number of render workers.")
+    ap.add_argument("--pages", type=int, default=120)
+    ap.add_argument("--photos", type=int, default=24, help="distinct photos (24 MP each by default)")
+    ap.add_argument("--photo-size", default="6000x4000")
+    ap.add_argument("--workers", default="1,2,4,8,16")
+    ap.add_argument("--quality", default="print")
+    args = ap.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Asset.__table__])
+    w, h = (int(x) for x in args.photo_size.split("x"))
+    photos = [_photo(k, w, h) for k in range(args.photos)]
+    document = _document(args.pages, photos)
+    pages_cache = os.path.join(settings.STORAGE_LOCAL_DIR, ".cache", "export_pages")
+    settings.EXPORT_PARALLEL_MIN_PAGES = 2
+
+    with Session(engine) as db:
+        # Warm-up: resampled image variants are cached across exports, like in production.
+        settings.EXPORT_WORKERS = 1
+        export_document_to_pdf(db, document, quality=args.quality)
+        print(f"pages: {args.pages}  photos: {args.photos} x {w}x{h}  quality: {args.quality}  cpus: {os.cpu_count()}")
+        base = None
+        # The pool never runs more workers than CPUs (see pdf_exporter._export_workers).
+        for n in sorted({min(int(x), os.cpu_count() or 1) for x in args.workers.split(",")}):
+            shutil.rmtree(pages_cache, ignore_errors=True)  # cold page cache every run
+            settings.EXPORT_WORKERS = n
+            t = time.perf_counter()
+            pdf = export_document_to_pdf(db, document, quality=args.quality)
+            dt = time.perf_counter() - t
+            base = base or dt
+            print(f"workers {n:>2}: {dt:6.2f} s  ({base / dt:.1f}x)  {len(pdf) // 1024} KB")
+        t = time.perf_counter()
+        export_document_to_pdf(db, document, quality=args.quality)
+        print(f"warm page cache: {time.perf_counter() - t:6.2f} s")
+    shutil.rmtree(os.environ["STORAGE_LOCAL_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+from __future__ import annotations
+import argparse
+import json
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.settings import settings
+from app.services.asset_gc import collect_garbage
+
+# Meant to be run periodically (cron / scheduled container), e.g.:
+#   python -m scripts.gc_assets --grace-hours 48
+
+def main():
+    ap = argparse.ArgumentParser(description="Delete orphaned assets and stored files.")
+    ap.add_argument("--grace-hours", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    db = SessionLocal()
+    try:
+        report = collect_garbage(db, grace_hours=args.grace_hours, dry_run=args.dry_run)
+        print(json.dumps(report, indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
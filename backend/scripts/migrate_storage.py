@@ -0,0 +1,11 @@
+from __future__ import annotations
+from app.services.storage import migrate_flat_layout, upload_local_objects
+
+def main():
+    moved = migrate_flat_layout()
+    print("Moved files into sharded layout:", moved)
+    uploaded = upload_local_objects()
+    print("Uploaded local files to the storage backend:", uploaded)
+
+if __name__ == "__main__":
+    main()
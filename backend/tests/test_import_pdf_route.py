@@ -0,0 +1,64 @@
+import fitz
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.models.models  # noqa: F401  (registers the tables)
+from app.api.deps import get_current_user
+from app.api.routes import import_pdf as import_route
+from app.core.db import Base, SessionLocal, engine
+from app.models.models import Club, ImportResult, User
+
+
+def _pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72 + i), f"Page {i}: the quick brown fox jumps over the lazy dog", fontsize=14)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def test_same_pdf_uploaded_twice_reuses_the_cached_import(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(import_route, "queue", None)  # no Redis: imports run in the request
+    db = SessionLocal()
+    try:
+        user = User(email=f"import-cache-{id(db)}@example.com", password_hash="-")
+        db.add(user)
+        db.flush()
+        club = Club(owner_id=user.id, name="Club")
+        db.add(club)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        club_id = club.id
+    finally:
+        db.close()
+
+    app = FastAPI()
+    app.include_router(import_route.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+    pdf = _pdf(3)
+
+    first = client.post(f"/api/import/{club_id}", files={"file": ("a.pdf", pdf, "application/pdf")})
+    assert first.status_code == 200, first.text
+    assert first.json()["pages_done"] == 3  # imported in the request, not cloned
+    assert not first.json().get("cached")
+
+    db = SessionLocal()
+    try:
+        cached_before = db.query(ImportResult).count()
+    finally:
+        db.close()
+    assert cached_before >= 1
+
+    second = client.post(f"/api/import/{club_id}", files={"file": ("b.pdf", pdf, "application/pdf")})
+    assert second.status_code == 200, second.text
+    body = second.json()
+    assert body["status"] == "done"
+    assert body["cached"] is True
+    assert body["pages_done"] == 3
+    assert body["project_id"] != first.json()["project_id"]
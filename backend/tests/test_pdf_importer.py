@@ -0,0 +1,34 @@
+import random
+
+from app.services.pdf_importer import _coalesce_text_blocks
+
+
+def _assert_partition(groups, n):
+    flat = [k for g in groups for k in g]
+    assert sorted(flat) == list(range(n))
+
+
+def test_thin_overlapping_blocks_are_kept():
+    boxes = [(100, 100, 200, 101.5), (100, 100.5, 200, 102)]
+    groups = _coalesce_text_blocks(boxes, [1.5, 1.5], [None, None])
+    _assert_partition(groups, 2)
+
+
+def test_paragraph_blocks_chain_top_to_bottom():
+    boxes = [(50, 100, 250, 130), (50, 134, 250, 160), (300, 100, 500, 130)]
+    groups = _coalesce_text_blocks(boxes, [10, 10, 10], [None, None, None])
+    assert [0, 1] in groups
+    _assert_partition(groups, 3)
+
+
+def test_every_block_lands_in_exactly_one_group():
+    rng = random.Random(7)
+    for _ in range(200):
+        n = rng.randint(1, 40)
+        boxes = []
+        for _k in range(n):
+            x0, y0 = rng.uniform(0, 500), rng.uniform(0, 800)
+            boxes.append((x0, y0, x0 + rng.uniform(0.5, 200), y0 + rng.uniform(0.5, 30)))
+        sizes = [rng.choice([1.5, 9, 10, 11, 24]) for _k in range(n)]
+        bgs = [rng.choice([None, "#ffffff"]) for _k in range(n)]
+        _assert_partition(_coalesce_text_blocks(boxes, sizes, bgs), n)
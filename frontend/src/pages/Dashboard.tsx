@@ -27,6 +27,7 @@ export default function Dashboard() {
 
   const [importing, setImporting] = useState(false);
   const [importError, setImportError] = useState<string | null>(null);
+  const [importProgress, setImportProgress] = useState<{ done: number; total: number } | null>(null);
 
   useEffect(() => {
     loadClubs().catch(() => {});
@@ -100,20 +101,32 @@ export default function Dashboard() {
         }
         const fd = new FormData();
         fd.append("file", file);
-        fd.append("club_id", activeClubId);
-        fd.append("editable", editable ? "true" : "false");
+        const preset = editable ? "smart" : "background";
 
         try {
-          const res = await api.post(`/api/import_pdf`, fd, {
+          const res = await api.post(`/api/import/${encodeURIComponent(activeClubId)}?preset=${preset}`, fd, {
             headers: { "Content-Type": "multipart/form-data" },
           });
           const projectId = res.data?.project_id;
           if (!projectId) throw new Error("No project_id");
+
+          // With a worker the import runs in the background and pages are saved as
+          // they finish: open the editor as soon as the first one is ready.
+          if (res.data?.job_id) {
+            for (;;) {
+              const st = (await api.get(`/api/import/project/${projectId}/status`)).data;
+              if (st?.status === "failed") throw new Error(st.error || "Import failed");
+              if (st?.pages_total) setImportProgress({ done: st.pages_done, total: st.pages_total });
+              if (st?.status === "done" || st?.pages_done > 0) break;
+              await new Promise((r) => setTimeout(r, 1000));
+            }
+          }
           window.location.href = `/editor?project=${encodeURIComponent(projectId)}`;
         } catch (e: any) {
           setImportError(`No se pudo cargar el proyecto (API): ${getApiErrorMessage(e)}`);
         } finally {
           setImporting(false);
+          setImportProgress(null);
         }
       };
       input.click();
@@ -142,7 +155,11 @@ export default function Dashboard() {
 
       {importing && (
         <div className="banner">
-          <b>Cargando PDF…</b> Esto puede tardar 20–90s según páginas. Cuando termine, se abrirá el editor.
+          <b>Cargando PDF…</b>{" "}
+          {importProgress
+            ? `Página ${importProgress.done} de ${importProgress.total}.`
+            : "Esto puede tardar 20–90s según páginas."}{" "}
+          Cuando termine, se abrirá el editor.
         </div>
       )}
 
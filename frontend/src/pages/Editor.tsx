@@ -12,6 +12,18 @@ const A4_H = 841.8898;
 const API_BASE = String((import.meta as any)?.env?.VITE_API_BASE || "").replace(/\/+$/, "");
 const withApiBase = (path: string) => (API_BASE ? `${API_BASE}${path.startsWith("/") ? path : `/${path}`}` : path);
 const assetFileUrl = (assetId: string) => withApiBase(`/api/assets/file/${assetId}`);
+// The canvas never shows images wider than ~2x the A4 page width, so it loads a
+// resized WebP variant (cached server-side) instead of the full-resolution original.
+const CANVAS_IMAGE_WIDTH = 1200;
+const assetImageUrl = (assetId: string, w: number = CANVAS_IMAGE_WIDTH) =>
+  `${assetFileUrl(assetId)}?w=${w}&fmt=webp`;
+// Imported page backgrounds (items with sourcePage) are rendered server-side from the
+// source PDF at the zoom the canvas needs: canvas zoom x devicePixelRatio, rounded up
+// to half steps so nearby zooms share one cached raster.
+const pageRasterUrl = (pdfAssetId: string, page: number, level: number) =>
+  `${assetFileUrl(pdfAssetId)}/page/${page}?zoom=${level}&fmt=webp`;
+const rasterLevel = (zoom: number) =>
+  Math.min(4, Math.max(1, Math.ceil(zoom * (window.devicePixelRatio || 1) * 2) / 2));
 
 type ImgMap = Record<string, HTMLImageElement>;
 
@@ -266,6 +278,34 @@ export default function Editor() {
     })();
   }, [projectId]);
 
+  // Progressive PDF import: pages still being imported are placeholders
+  // ({pending: true}). Poll the import and swap them in as they finish.
+  const importRunning = doc?.meta?.import?.status === "running";
+  const sourcePdfId: string | null = doc?.meta?.source_pdf_asset_id || null;
+  useEffect(() => {
+    if (!projectId || !importRunning) return;
+    let lastDone = -1;
+    const timer = window.setInterval(async () => {
+      try {
+        const st = (await api.get(`/api/import/project/${projectId}/status`)).data;
+        if (st?.pages_done === lastDone && st?.status === "running") return;
+        lastDone = st?.pages_done;
+        const { data } = await api.get(`/api/projects/item/${projectId}`);
+        const fresh = data.document;
+        setDoc((prev: any) => {
+          if (!prev) return fresh;
+          const pages = (prev.pages || []).map((p: any, i: number) =>
+            p?.pending && fresh.pages?.[i] && !fresh.pages[i].pending ? fresh.pages[i] : p
+          );
+          return { ...prev, pages, meta: { ...(prev.meta || {}), ...(fresh.meta || {}) } };
+        });
+      } catch (e) {
+        console.error("import status failed", e);
+      }
+    }, 2000);
+    return () => window.clearInterval(timer);
+  }, [projectId, importRunning]);
+
   // Preload images used in current page (and locked logo)
   useEffect(() => {
     if (!doc?.pages?.length) return;
@@ -276,10 +316,12 @@ export default function Editor() {
     for (const layer of p.layers || []) {
       for (const it of layer.items || []) {
         if (it.type === "ImageFrame" && it.assetRef && !String(it.assetRef).startsWith("{{")) {
-          urls.add(assetFileUrl(String(it.assetRef)));
+          urls.add(assetImageUrl(String(it.assetRef)));
+        } else if (it.type === "ImageFrame" && it.sourcePage != null && sourcePdfId) {
+          urls.add(pageRasterUrl(sourcePdfId, it.sourcePage, rasterLevel(zoom)));
         }
         if (it.type === "LockedLogoStamp" && club?.locked_logo_asset_id) {
-          urls.add(assetFileUrl(String(club.locked_logo_asset_id)));
+          urls.add(assetImageUrl(String(club.locked_logo_asset_id)));
         }
       }
     }
@@ -294,7 +336,7 @@ export default function Editor() {
         inflight.current.delete(url);
       };
     });
-  }, [doc, pageIndex, club?.locked_logo_asset_id]); // eslint-disable-line react-hooks/exhaustive-deps
+  }, [doc, pageIndex, zoom, club?.locked_logo_asset_id]); // eslint-disable-line react-hooks/exhaustive-deps
 
   // Transformer binding
   useEffect(() => {
@@ -1065,12 +1107,14 @@ export default function Editor() {
           : refStr && refStr.startsWith("data:")
             ? refStr
             : refStr
-              ? assetFileUrl(refStr)
-              : null;
+              ? assetImageUrl(refStr)
+              : it.sourcePage != null && sourcePdfId
+                ? pageRasterUrl(sourcePdfId, it.sourcePage, rasterLevel(zoom))
+                : null;
 
       // Locked logo stamp uses club locked_logo_asset_id
       const finalUrl = it.role === "locked_logo" && club?.locked_logo_asset_id
-        ? assetFileUrl(String(club.locked_logo_asset_id))
+        ? assetImageUrl(String(club.locked_logo_asset_id))
         : url;
 
       const img = finalUrl ? imgMap[finalUrl] : null;
@@ -1174,7 +1218,7 @@ export default function Editor() {
 
     if (it.type === "LockedLogoStamp") {
       // rendered as ImageFrame path
-      const finalUrl = club?.locked_logo_asset_id ? assetFileUrl(String(club.locked_logo_asset_id)) : null;
+      const finalUrl = club?.locked_logo_asset_id ? assetImageUrl(String(club.locked_logo_asset_id)) : null;
       const img = finalUrl ? imgMap[finalUrl] : null;
       return (
         <Group key={id} id={id} x={r.x} y={r.y}>